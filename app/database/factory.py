@@ -5,6 +5,7 @@ from beanie import init_beanie, Document
 from motor import motor_asyncio
 
 from app.settings.app_settings import AppSettings
+from app.helpers.metrics import MongoCommandMetrics
 from app.models.thesis_data import ThesisData
 from app.models.cluster_history import ClusterHistory
 import logging
@@ -45,7 +46,8 @@ async def initialize():
     app_settings = AppSettings()
 
     # CREATE MOTOR CLIENT
-    client = motor_asyncio.AsyncIOMotorClient(app_settings.mongo_dsn, maxPoolSize=5)
+    client = motor_asyncio.AsyncIOMotorClient(
+        app_settings.mongo_dsn, maxPoolSize=5, event_listeners=[MongoCommandMetrics()])
 
     # INIT BEANIE
     await init_beanie(
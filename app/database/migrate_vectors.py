@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import logging
+
+from motor import motor_asyncio
+from pymongo import UpdateOne
+
+from app.settings.app_settings import AppSettings
+from app.models.thesis_data import ThesisData, PackedVector, encode_packed_vector, vector_fields
+
+_logger = logging.getLogger(__name__)
+
+
+async def migrate_vectors(batch_size: int = 200, repack: bool = False):
+    # Rewrite the embeddings stored as float arrays into packed binary, with repack every
+    # vector is rewritten (e.g. after changing VECTOR_STORAGE_DTYPE)
+    app_settings = AppSettings()
+    client = motor_asyncio.AsyncIOMotorClient(app_settings.mongo_dsn)
+    collection = client.get_database()[ThesisData.Collection.name]
+
+    if repack:
+        query = {"$or": [{field: {"$ne": None}} for field in vector_fields]}
+    else:
+        query = {"$or": [{field: {"$type": "array"}} for field in vector_fields]}
+
+    operations = []
+    total = 0
+    async for document in collection.find(query, projection=vector_fields):
+        update_data = {}
+        for field in vector_fields:
+            value = document.get(field)
+            if value is None or (not repack and not isinstance(value, list)):
+                continue
+            update_data[field] = encode_packed_vector(PackedVector.validate(value))
+        if update_data:
+            operations.append(UpdateOne({"_id": document["_id"]}, {"$set": update_data}))
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations, ordered=False)
+            total += len(operations)
+            operations = []
+            _logger.info(f"Migrated {total} thesis documents")
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        total += len(operations)
+    _logger.info(f"Finished vector migration, {total} thesis documents updated")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store thesis embeddings as packed binary")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--repack", action="store_true", help="rewrite vectors that are already packed")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(migrate_vectors(batch_size=args.batch_size, repack=args.repack))
@@ -1,12 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime
 
 from app.dto.common import (
     BasePaginationResponseData, BaseResponseData, BeanieDocumentWithId
 )
-from app.models.cluster_history import ClusterPartialResult, ClusterJobStatus, MinimumThesisData, ClusterConfig, JobStatusType
-from app.models.thesis_data import ThesisData
+from app.models.cluster_history import ClusterPartialResult, ClusterJobStatus, MinimumThesisData, ClusterConfig, JobStatusType, \
+    ClusterTiming
+from app.dto.thesis_data_dto import ThesisVectors
+from app.models.thesis_data import vector_json_encoders
 
 
 # DTO for list response (Inherit BeanieDocumentWithId so the response include databaseID)
@@ -16,6 +18,8 @@ class ShortClusterHistory(BeanieDocumentWithId):
     created_at: datetime
     updated_at: datetime
     cluster_job_status: ClusterJobStatus
+    sweep_id: Optional[str]
+    final_loss: Optional[float]
 
 
 # DTO for detail response
@@ -25,12 +29,88 @@ class FullClusterHistory(ShortClusterHistory):
     non_clustered_thesis: List[MinimumThesisData]
     loss_values: List[float]
     config: ClusterConfig
+    timing: Optional[ClusterTiming]
+
+
+# DTO for a single result of a history, the other results are not read
+class ClusterHistoryResult(ShortClusterHistory):
+    chosen_loop: Optional[int]
+    non_clustered_thesis: List[MinimumThesisData]
+    config: ClusterConfig
+    total_results: int
+    result_index: Optional[int]
+    result: Optional[ClusterPartialResult]
+
+
+# DTO for a page of the results of a history, in the order they were stored
+class ClusterResultPage(BaseModel):
+    total: int
+    items: List[ClusterPartialResult]
+
+
+class ClusterResultItem(ClusterPartialResult):
+    index: int
+
+
+# DTO for the configs of the histories of a sweep, run together by the worker
+class ClusterSweepVariant(BeanieDocumentWithId):
+    config: ClusterConfig
+
+
+# DTO for the comparison of the histories of a sweep
+class SweepClusterHistory(ShortClusterHistory):
+    config: ClusterConfig
+
+
+# DTO for the job of a history, and for the histories an nlp result may complete
+class ClusterHistoryJob(BeanieDocumentWithId):
+    sweep_id: Optional[str]
+
+
+# DTO for the nlp stage of a job
+class ClusterHistoryJobTheses(ClusterHistoryJob):
+    non_clustered_thesis: List[MinimumThesisData]
+
+
+# DTO for the data the worker reads from a history, the results already stored are left out
+class ClusterHistoryJobConfig(ClusterHistoryJobTheses):
+    config: ClusterConfig
 
 
 # DTO for worker response
-class WorkerClusterHistory(FullClusterHistory):
+class WorkerClusterHistory(ClusterHistoryJobConfig):
+    cluster_job_status: ClusterJobStatus
     ready_for_cluster: Optional[bool]
-    detail_thesis_dict: Optional[Dict[str, ThesisData]]
+    detail_thesis_dict: Optional[Dict[str, ThesisVectors]]
+    initial_labels: Optional[List[int]]
+    sweep_variants: Optional[List[ClusterSweepVariant]]
+
+
+# DTO for status response, only the job status is read from the database
+class ClusterHistoryStatus(BaseModel):
+    cluster_job_status: ClusterJobStatus
+
+
+class ClusterJobProgress(ClusterJobStatus):
+    ready_for_cluster: bool
+
+
+# DTO for the start of the clustering stage of a job, claimed is only true for the caller that moved it
+class ClusterJobClaim(BaseModel):
+    claimed: bool
+    waiting_nlp: bool
+    n_variants: int = 0
+
+
+# DTO for the theses the worker still has to run through the nlp stage
+class NlpPendingThesis(BaseModel):
+    id: str
+    title: str
+    category: str
+    expected_result: str
+    problem_solve: str
+    # Task that was scheduled for the thesis when it was uploaded
+    nlp_job_id: Optional[str]
 
 
 class ClusterHistoryResponse(BaseResponseData):
@@ -41,26 +121,73 @@ class ClusterHistoryPaginationData(BasePaginationResponseData):
     items: List[ShortClusterHistory]
 
 
+class ClusterResultPaginationData(BasePaginationResponseData):
+    items: List[ClusterResultItem]
+
+
+class ClusterHistoryResultResponse(BaseResponseData):
+    data: ClusterHistoryResult
+
+
+class ClusterResultPaginationResponse(BaseResponseData):
+    data: ClusterResultPaginationData
+
+
 class WorkerClusterHistoryResponse(BaseResponseData):
     data: Optional[WorkerClusterHistory]
 
+    class Config:
+        json_encoders = vector_json_encoders
+
+
+class ClusterJobProgressResponse(BaseResponseData):
+    data: ClusterJobProgress
+
+
+class ClusterJobClaimResponse(BaseResponseData):
+    data: ClusterJobClaim
+
+
+class NlpPendingThesisResponse(BaseResponseData):
+    data: List[NlpPendingThesis]
+
 
 class ClusterHistoryPaginationResponse(BaseResponseData):
     data: ClusterHistoryPaginationData
 
 
+class ClusterSweepResponse(BaseResponseData):
+    data: List[SweepClusterHistory]
+
+
 #DTO for update request
 class ClusterHistoryPutRequest(BaseModel):
     name: Optional[str]
     description: Optional[str]
-    chosen_loop: Optional[int]
+    # Index of the chosen result in clusters
+    chosen_loop: Optional[int] = Field(None, ge=0)
     clusters: Optional[List[ClusterPartialResult]]
 
 
 class ClusterHistoryResultPutRequest(BaseModel):
     cluster_result: List[dict]
+    # Loss values computed since the previous result, they are appended to the history
     loss_values: List[float]
+    loop: Optional[int]
+    # Number of results the worker already sent, a result is only stored once and in order
+    result_index: Optional[int]
+
+
+# DTO for result updates, only the thesis list is read from the database
+class ClusterHistoryThesisList(BaseModel):
+    non_clustered_thesis: List[MinimumThesisData]
 
 
 class ClusterHistoryStatusPutRequest(BaseModel):
-    status: JobStatusType
\ No newline at end of file
+    status: JobStatusType
+    # Sets the status of every history of the sweep of the history
+    whole_job: bool = False
+
+
+class ClusterHistoryTimingPutRequest(ClusterTiming):
+    pass
\ No newline at end of file
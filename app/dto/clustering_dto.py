@@ -1,22 +1,18 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from app.dto.common import BaseResponseData
 from app.dto.cluster_history_dto import ShortClusterHistory
+from app.models.cluster_history import ClusterConfig
 
 
 class ClusterHistoryCreateResponse(BaseResponseData):
     data: Optional[ShortClusterHistory]
 
 
-class ClusterHistoryConfig(BaseModel):
-    order: list = [0, 1, 2, 3]
-    number_of_clusters: int = 10
-    max_item_each_cluster: int = 10
-    max_loop: int = 50
-    upper_m: float = 1.1
-    lower_m: float = 9.1
-    alpha: float = 2.0
+# Same fields as the config stored with the history, documented on ClusterConfig
+class ClusterHistoryConfig(ClusterConfig):
+    pass
 
 
 class ClusterHistoryThesisFilter(BaseModel):
@@ -31,8 +27,10 @@ class ClusterHistoryCreateRequest(BaseModel):
 
 
 class ClusterNameSuggestionRequest(BaseModel):
-    thesis_list_id: List[str]
+    thesis_list_id: List[str] = []
+    # One list of thesis ids per cluster, suggestions are then returned per cluster
+    cluster_list_ids: Optional[List[List[str]]]
 
 
 class ClusterNameSuggestionResponse(BaseResponseData):
-    data: List[str]
\ No newline at end of file
+    data: Union[List[List[str]], List[str]]
\ No newline at end of file
@@ -5,6 +5,7 @@ from datetime import datetime
 from app.dto.common import (
     BasePaginationResponseData, BaseResponseData, BeanieDocumentWithId
 )
+from app.models.thesis_data import PackedVector
 
 
 class ThesisStudentData(BaseModel):
@@ -28,6 +29,34 @@ class FullThesisData(ShortThesisData):
     updated_at: datetime
 
 
+# Projections for internal queries, so the embeddings are only read where they are used
+class ThesisNlpState(BeanieDocumentWithId):
+    need_nlp_extract: bool = True
+
+
+class ThesisCategory(BeanieDocumentWithId):
+    category: str
+
+
+# Text fields only
+class ThesisMetadata(ThesisNlpState):
+    semester: str
+    title: str
+    category: str
+    expected_result: str
+    problem_solve: str
+    student_data: ThesisStudentData
+    nlp_job_id: Optional[str]
+
+
+# Embeddings only
+class ThesisVectors(ThesisNlpState):
+    title_vector: Optional[PackedVector]
+    category_vector: Optional[PackedVector]
+    expected_result_vector: Optional[PackedVector]
+    problem_solve_vector: Optional[PackedVector]
+
+
 class ThesisDataResponse(BaseResponseData):
     data: Optional[FullThesisData]
 
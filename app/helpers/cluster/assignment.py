@@ -0,0 +1,169 @@
+from typing import List
+
+import numpy as np
+
+# Capacity constrained assignment of the points to the clusters from the membership matrix (N x K).
+# Every method returns the cluster of each point, -1 for the points left out once every cluster is full
+
+default_auction_epsilon = 1e-4
+auction_scaling_factor = 4
+
+
+def assign_sequential(membership: np.ndarray, max_size_cluster: int) -> np.ndarray:
+    # Original rule: points in index order, each one takes its best cluster that still has room
+    n_points, n_clusters = membership.shape
+    labels = np.full(n_points, -1, dtype=np.int64)
+    sizes = [0] * n_clusters
+    ranking = np.argsort(-membership, axis=1, kind="stable")
+    for idx, order in enumerate(ranking.tolist()):
+        for id_cluster in order:
+            if sizes[id_cluster] < max_size_cluster:
+                sizes[id_cluster] += 1
+                labels[idx] = id_cluster
+                break
+    return labels
+
+
+def _keep_best(clusters: np.ndarray, scores: np.ndarray, points: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    # Mask of the candidates kept by their cluster: the capacity best scores of every cluster,
+    # ties are won by the lower point index
+    order = np.lexsort((points, -scores, clusters))
+    sorted_clusters = clusters[order]
+    group_start = np.searchsorted(sorted_clusters, sorted_clusters, side="left")
+    rank = np.arange(len(order)) - group_start
+    keep = np.zeros(len(order), dtype=bool)
+    keep[order] = rank < capacities[sorted_clusters]
+    return keep
+
+
+def assign_global_greedy(membership: np.ndarray, max_size_cluster: int) -> np.ndarray:
+    # Same result as taking the (point, cluster) pairs by decreasing membership and keeping a pair
+    # when the point is free and the cluster has room, so no point wins capacity by its index.
+    # Computed as rounds of deferred acceptance: every free point proposes to its next best cluster
+    # and every cluster keeps the best proposals among the ones it holds
+    n_points, n_clusters = membership.shape
+    labels = np.full(n_points, -1, dtype=np.int64)
+    ranking = np.argsort(-membership, axis=1, kind="stable")
+    next_choice = np.zeros(n_points, dtype=np.int64)
+    capacities = np.full(n_clusters, max(max_size_cluster, 0), dtype=np.int64)
+
+    while True:
+        free = np.flatnonzero((labels < 0) & (next_choice < n_clusters))
+        if len(free) == 0:
+            break
+        proposals = ranking[free, next_choice[free]]
+        next_choice[free] += 1
+
+        # Only the clusters that received a proposal can change
+        asked = np.zeros(n_clusters + 1, dtype=bool)
+        asked[proposals] = True
+        held = np.flatnonzero(asked[labels])
+        points = np.concatenate([held, free])
+        clusters = np.concatenate([labels[held], proposals])
+        keep = _keep_best(clusters, membership[points, clusters], points, capacities)
+        labels[points] = np.where(keep, clusters, -1)
+    return labels
+
+
+def assign_auction(
+    membership: np.ndarray,
+    max_size_cluster: int,
+    epsilon: float = default_auction_epsilon,
+) -> np.ndarray:
+    # Capacitated assignment maximizing the total membership, solved by a Jacobi auction with epsilon
+    # scaling on the slots of the clusters; the total membership is within n_points * epsilon of the optimum.
+    # The problem is balanced before the auction: when the clusters cannot hold every point a dummy
+    # cluster of value 0 takes the remaining ones, when they have spare room dummy points of value 0
+    # take the spare slots
+    n_points, n_clusters = membership.shape
+    if max_size_cluster <= 0 or n_clusters == 0:
+        return np.full(n_points, -1, dtype=np.int64)
+    values = membership.astype(np.float64)
+    capacities = [min(max_size_cluster, n_points)] * n_clusters
+    overflow = n_points - sum(capacities)
+    if overflow > 0:
+        values = np.hstack([values, np.zeros((n_points, 1))])
+        capacities.append(overflow)
+    n_objects = values.shape[1]
+    n_persons = n_points + max(-overflow, 0)
+
+    # Slot prices of every cluster kept in increasing order, the padding slots can never be bought
+    n_slots = max(capacities)
+    slot_prices = np.zeros((n_objects, n_slots), dtype=np.float64)
+    for id_object, capacity in enumerate(capacities):
+        slot_prices[id_object, capacity:] = np.inf
+
+    value_range = float(values.max() - values.min())
+    step = max(value_range / auction_scaling_factor, epsilon)
+    while True:
+        labels = np.full(n_persons, -1, dtype=np.int64)
+        slot_holders = np.full((n_objects, n_slots), -1, dtype=np.int64)
+        while True:
+            free = np.flatnonzero(labels < 0)
+            if len(free) == 0:
+                break
+            cheapest = slot_prices[:, 0]
+            second_cheapest = slot_prices[:, 1] if n_slots > 1 else np.full(n_objects, np.inf)
+
+            # Dummy points value every cluster at 0, so they all share the same net values
+            real = free < n_points
+            free_values = np.zeros((len(free), n_objects), dtype=np.float64)
+            free_values[real] = values[free[real]]
+            net = free_values - cheapest
+            best = net.argmax(axis=1)
+            rows = np.arange(len(free))
+            first_value = net[rows, best]
+            # Second best: the next slot of the same cluster or the cheapest slot of another cluster
+            second_value = free_values[rows, best] - second_cheapest[best]
+            if n_objects > 1:
+                net[rows, best] = -np.inf
+                second_value = np.maximum(second_value, net.max(axis=1))
+            second_value = np.where(np.isfinite(second_value), second_value, first_value)
+            bids = cheapest[best] + first_value - second_value + step
+
+            # The best bids of a cluster buy its cheapest slots, as long as they are above the slot price
+            order = np.lexsort((free, -bids, best))
+            sorted_best = best[order]
+            slots = np.arange(len(order)) - np.searchsorted(sorted_best, sorted_best, side="left")
+            in_range = slots < n_slots
+            order, sorted_best, slots = order[in_range], sorted_best[in_range], slots[in_range]
+            accepted = bids[order] > slot_prices[sorted_best, slots]
+            order, sorted_best, slots = order[accepted], sorted_best[accepted], slots[accepted]
+
+            evicted = slot_holders[sorted_best, slots]
+            labels[evicted[evicted >= 0]] = -1
+            slot_holders[sorted_best, slots] = free[order]
+            slot_prices[sorted_best, slots] = bids[order]
+            labels[free[order]] = sorted_best
+            for id_object in np.unique(sorted_best):
+                slot_order = np.argsort(slot_prices[id_object], kind="stable")
+                slot_prices[id_object] = slot_prices[id_object, slot_order]
+                slot_holders[id_object] = slot_holders[id_object, slot_order]
+        if step <= epsilon:
+            break
+        step = max(step / auction_scaling_factor, epsilon)
+
+    labels = labels[:n_points]
+    labels[labels >= n_clusters] = -1
+    return labels
+
+
+assignment_methods = {
+    "sequential": assign_sequential,
+    "global_greedy": assign_global_greedy,
+    "auction": assign_auction,
+}
+
+
+def get_assignment(method: str, membership: np.ndarray, max_size_cluster: int) -> np.ndarray:
+    if method not in assignment_methods:
+        raise ValueError(f"Unknown assignment method {method}")
+    return assignment_methods[method](np.asarray(membership, dtype=np.float64), max_size_cluster)
+
+
+def get_cluster_members(labels: np.ndarray, n_clusters: int) -> List[List[int]]:
+    # Points of every cluster in index order
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    bounds = np.searchsorted(sorted_labels, np.arange(n_clusters + 1), side="left")
+    return [order[bounds[id_cluster]:bounds[id_cluster + 1]].tolist() for id_cluster in range(n_clusters)]
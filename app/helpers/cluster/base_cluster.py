@@ -1,8 +1,9 @@
-from pydantic import BaseModel
 from typing import List
+import numpy as np
 
-class ClusterObject(BaseModel):
-    pass
+class ClusterObject():
+    # Lightweight holder, subclasses declare their fields in __slots__
+    __slots__ = ()
 
 class ClusterService():
 
@@ -11,3 +12,11 @@ class ClusterService():
     
     def calculate_centroid_from_list_and_uik(self, uik_pow: list, data: List[ClusterObject]) -> ClusterObject:
         raise NotImplementedError()
+
+    # Array-backed interface used by the vectorized engine: the distance between two objects
+    # is the weighted sum of the euclidean distances of each field
+    def get_data_matrices(self, data: List[ClusterObject]) -> List[np.ndarray]:
+        raise NotImplementedError()
+
+    def get_field_multipliers(self) -> List[float]:
+        raise NotImplementedError()
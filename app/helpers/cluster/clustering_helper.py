@@ -1,10 +1,14 @@
 import sys
 import math
 import random
+import time
 import numpy as np
-from typing import List
+from typing import List, Optional
 
 from app.helpers.cluster.base_cluster import ClusterObject, ClusterService
+from app.helpers.cluster.assignment import get_assignment, get_cluster_members
+from app.helpers.cluster.initialization import get_initial_members
+from app.helpers.cluster.profiling import PhaseTimer
 
 # Base on MC-FMC
 
@@ -21,7 +25,16 @@ class ClusteringAlgorithm:
         alpha: float = 2.0,
         epsilon: float = 0.001,
         n_loop: int = 50,
+        loss_tolerance: float = 0,
+        loss_window: int = 3,
+        initial_labels: Optional[List[int]] = None,
+        init_method: str = "kmeans++",
+        random_state: Optional[int] = None,
+        assignment: str = "sequential",
+        timer: Optional[PhaseTimer] = None,
     ) -> None:
+        # Time of every phase and loop, see profiling.py
+        self.timer = timer or PhaseTimer()
         self.dataset = dataset
         self.model = model
         self.n_clusters = n_clusters
@@ -35,11 +48,36 @@ class ClusteringAlgorithm:
         self.is_stop = False
         self.pred_labels = [[] for _ in range(self.n_clusters)]
         self.loss_values = []
+        # Stop once the relative change of the loss stays below loss_tolerance for loss_window loops
+        self.loss_tolerance = loss_tolerance
+        self.loss_window = max(loss_window, 1)
+        # Cluster of every point from a previous run (-1 when unknown), used to seed the centroids
+        self.initial_labels = initial_labels
+        # "legacy" keeps the original greedy picks, otherwise one of the initialization methods
+        self.init_method = init_method
+        self.random_state = random_state
+        # How the capacity of the clusters is shared, see assignment.py
+        self.assignment = assignment
 
         # Calculate fuzzi_m_i
-        N = len(dataset)
-        mean_c = math.floor(N / n_clusters)
+        with self.timer.phase("fuzzifier"):
+            N = len(dataset)
+            mean_c = math.floor(N / n_clusters)
+            delta_array = self._calculate_delta_array(mean_c)
+
+            min_arr = min(delta_array)
+            max_arr = max(delta_array)
+            for i in range(N):
+                fuzzi_m_i = lower_m + \
+                    (upper_m - lower_m) * \
+                    pow((delta_array[i]-min_arr) / (max_arr-min_arr), alpha)
+                self.fuzzi_m.append(fuzzi_m_i)
+
+    def _calculate_delta_array(self, mean_c: int) -> List[float]:
+        # Sum of the distances to the mean_c nearest points (itself included)
+        N = len(self.dataset)
         distance_array = [[0] * N for _ in range(N)]
+        evaluations = 0
         for i in range(N):
             for j in range(N):
                 if i == j:
@@ -47,44 +85,61 @@ class ClusteringAlgorithm:
                 if distance_array[j][i] != 0:
                     distance_array[i][j] = distance_array[j][i]
                     continue
-                distance_array[i][j] = model.get_distance_between_two_object(
-                    dataset[i], dataset[j])
+                distance_array[i][j] = self.model.get_distance_between_two_object(
+                    self.dataset[i], self.dataset[j])
+                evaluations += 1
+        self.timer.count("distance_evaluations", evaluations)
 
         delta_array = []
         for i in range(N):
             sorted_arr  = sorted(distance_array[i])
             sum_i = sum(sorted_arr[:mean_c])
             delta_array.append(sum_i)
-
-        min_arr = min(delta_array)
-        max_arr = max(delta_array)
-        for i in range(N):
-            fuzzi_m_i = lower_m + \
-                (upper_m - lower_m) * \
-                pow((delta_array[i]-min_arr) / (max_arr-min_arr), alpha)
-            self.fuzzi_m.append(fuzzi_m_i)
-        
+        return delta_array
 
     def clustering(self):
-        self._generate_centroid()
+        with self.timer.phase("init"):
+            if self.initial_labels is not None and self._has_initial_clusters():
+                self._generate_centroid_from_labels()
+            elif self.init_method != "legacy":
+                self._generate_centroid_from_members(self._get_initial_members())
+            else:
+                self._generate_centroid()
         th_loop = 1
         while th_loop <= self.n_loop and not self.is_stop:
+            # The time spent by the caller between two loops is not part of the loop
+            loop_start = time.perf_counter()
             self.is_stop = True
-            self._update_membership()
-            self._update_centroid()
-            self._calculate_loss_function()
+            with self.timer.phase("membership"):
+                self._update_membership()
+            with self.timer.phase("centroid"):
+                self._update_centroid()
+            with self.timer.phase("loss"):
+                self._calculate_loss_function()
+            if self._is_loss_converged():
+                self.is_stop = True
             th_loop += 1
-            self.pred_labels = [[] for _ in range(self.n_clusters)]
-            for idx, membership in enumerate(self.membership):
-                sorted_membership = sorted(membership, key=float, reverse=True)
-                for data in sorted_membership:
-                    id_cluster = membership.index(data)
-                    if len(self.pred_labels[id_cluster]) < self.max_size_cluster:
-                        self.pred_labels[id_cluster].append(idx)
-                        break
+            with self.timer.phase("assignment"):
+                self._assign_labels()
+            self.timer.add_iteration(time.perf_counter() - loop_start)
 
             yield self.pred_labels, self.loss_values
 
+    def _assign_labels(self):
+        if self.assignment != "sequential":
+            labels = get_assignment(self.assignment, np.array(self.membership), self.max_size_cluster)
+            self.pred_labels = get_cluster_members(labels, self.n_clusters)
+            return
+
+        self.pred_labels = [[] for _ in range(self.n_clusters)]
+        for idx, membership in enumerate(self.membership):
+            sorted_membership = sorted(membership, key=float, reverse=True)
+            for data in sorted_membership:
+                id_cluster = membership.index(data)
+                if len(self.pred_labels[id_cluster]) < self.max_size_cluster:
+                    self.pred_labels[id_cluster].append(idx)
+                    break
+
     def _generate_centroid(self):
         exclude_list = []
         # Set 1st centroid random
@@ -113,6 +168,54 @@ class ClusteringAlgorithm:
             exclude_list.append(next_centroid)
             self.centroid.append(self.dataset[next_centroid])
 
+    def _is_loss_converged(self) -> bool:
+        if not self.loss_tolerance or len(self.loss_values) <= self.loss_window:
+            return False
+        for previous, current in zip(self.loss_values[-self.loss_window - 1:-1], self.loss_values[-self.loss_window:]):
+            if abs(previous - current) > self.loss_tolerance * max(abs(previous), sys.float_info.min):
+                return False
+        return True
+
+    def _has_initial_clusters(self) -> bool:
+        return any(0 <= label < self.n_clusters for label in self.initial_labels)
+
+    def _generate_centroid_from_labels(self):
+        # Warm start: the centroid of every previous cluster is the mean of its points, the clusters
+        # without any point are filled with the point farthest from the centroids already chosen
+        centroids = [None] * self.n_clusters
+        for id_cluster in range(self.n_clusters):
+            uik = [1 if label == id_cluster else 0 for label in self.initial_labels]
+            if any(uik):
+                centroids[id_cluster] = self.model.calculate_centroid_from_list_and_uik(uik_pow=uik, data=self.dataset)
+
+        for id_cluster in range(self.n_clusters):
+            if centroids[id_cluster] is not None:
+                continue
+            chosen = [centroid for centroid in centroids if centroid is not None]
+            farthest = max(
+                range(len(self.dataset)),
+                key=lambda i: min(self._calculate_point_distance(self.dataset[i], centroid) for centroid in chosen)
+            )
+            centroids[id_cluster] = self.dataset[farthest]
+        self.centroid = centroids
+
+    def _get_initial_members(self) -> List[np.ndarray]:
+        return get_initial_members(
+            self.init_method,
+            self.model.get_data_matrices(self.dataset),
+            self.model.get_field_multipliers(),
+            self.n_clusters,
+            self.random_state,
+        )
+
+    def _generate_centroid_from_members(self, members: List[np.ndarray]):
+        self.centroid = []
+        for member in members:
+            uik = [0] * len(self.dataset)
+            for index in member:
+                uik[index] = 1
+            self.centroid.append(self.model.calculate_centroid_from_list_and_uik(uik_pow=uik, data=self.dataset))
+
     def _update_membership(self):
         dij = [
             [
@@ -153,6 +256,7 @@ class ClusteringAlgorithm:
         self.centroid = th_centroid
 
     def _calculate_point_distance(self, p1, p2):
+        self.timer.count("distance_evaluations")
         distance = self.model.get_distance_between_two_object(p1, p2)
         return distance if distance else self.epsilon
 
@@ -0,0 +1,196 @@
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+# Upper bound for the temporaries of one block of pairwise distances
+default_block_memory = 64 * 1024 * 1024
+# Number of block sized float32 temporaries alive while a block is computed
+# (the four per field blocks, the combined block and the expansion temporaries)
+block_temporaries = 8
+# Upper bound for keeping every per field pairwise distance between two passes
+default_cache_memory = 256 * 1024 * 1024
+
+
+def get_squared_norms(matrices: List[np.ndarray], dtype=None) -> List[np.ndarray]:
+    return [np.einsum("ij,ij->i", matrix, matrix, dtype=dtype) for matrix in matrices]
+
+
+def get_euclidean_distance_matrix(
+    first: np.ndarray,
+    second: np.ndarray,
+    first_squared_norms: Optional[np.ndarray] = None,
+    second_squared_norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b
+    if first_squared_norms is None:
+        first_squared_norms = np.einsum("ij,ij->i", first, first)
+    if second_squared_norms is None:
+        second_squared_norms = np.einsum("ij,ij->i", second, second)
+    norms_sum = first_squared_norms[:, None] + second_squared_norms[None, :]
+    squared = norms_sum - 2 * (first @ second.T)
+    # Drop the rounding noise of the expansion so identical points keep a distance of exactly 0
+    squared[squared <= 8 * np.finfo(squared.dtype).eps * norms_sum] = 0
+    return np.sqrt(squared)
+
+
+def get_distance_matrix(
+    first: List[np.ndarray],
+    second: List[np.ndarray],
+    field_multipliers: List[float],
+    first_squared_norms: Optional[List[np.ndarray]] = None,
+    second_squared_norms: Optional[List[np.ndarray]] = None,
+    dtype=np.float64,
+) -> np.ndarray:
+    # Weighted sum of the per field euclidean distances, shape (len(first), len(second))
+    result = np.zeros((first[0].shape[0], second[0].shape[0]), dtype=dtype)
+    for field, multiplier in enumerate(field_multipliers):
+        result += multiplier * get_euclidean_distance_matrix(
+            first[field],
+            second[field],
+            first_squared_norms[field] if first_squared_norms is not None else None,
+            second_squared_norms[field] if second_squared_norms is not None else None,
+        )
+    return result
+
+
+def get_weighted_centroids(uik_pow: np.ndarray, matrices: List[np.ndarray]) -> List[np.ndarray]:
+    # uik_pow has shape (N, K), every returned matrix has shape (K, D).
+    # Weights are normalized before being cast to the data type so the product does not copy the data
+    weights = np.ascontiguousarray((uik_pow / uik_pow.sum(axis=0)).T)
+    return [weights.astype(matrix.dtype, copy=False) @ matrix for matrix in matrices]
+
+
+def get_paired_distances(first: List[np.ndarray], second: List[np.ndarray], field_multipliers: List[float]) -> np.ndarray:
+    # Distance between first[i] and second[i] for every row i
+    result = np.zeros(first[0].shape[0], dtype=np.float64)
+    for field, multiplier in enumerate(field_multipliers):
+        result += multiplier * np.linalg.norm(first[field] - second[field], axis=1)
+    return result
+
+
+def get_chunk_size(n_points: int, block_memory: int = default_block_memory) -> int:
+    row_memory = n_points * np.dtype(np.float32).itemsize * block_temporaries
+    return max(1, min(n_points, block_memory // max(row_memory, 1)))
+
+
+class PairwiseDistanceCache:
+    # Shared source of pairwise distances for the field balance and the fuzzifier setup.
+    # Per field distances are produced in float32 blocks of chunk_size rows; when all of them fit in
+    # cache_memory the blocks of the first pass are kept so the second pass does not recompute them.
+    # Above the budget every pass computes them again, so what the later phases need is kept instead:
+    # the per field maxima of any pass and the delta arrays, which a sweep asks for all at once. A job
+    # then makes two passes, one for the field balance and one for the fuzzifiers of every config
+    def __init__(
+        self,
+        matrices: List[np.ndarray],
+        chunk_size: Optional[int] = None,
+        cache_memory: int = default_cache_memory,
+    ) -> None:
+        self.data = [np.ascontiguousarray(matrix, dtype=np.float32) for matrix in matrices]
+        self.squared_norms = get_squared_norms(self.data)
+        self.n_points = self.data[0].shape[0]
+        self.n_fields = len(self.data)
+        self.chunk_size = chunk_size or get_chunk_size(self.n_points)
+        self.cache_memory = cache_memory
+        self._blocks = None
+        self._max_distances = None
+        self._delta_arrays = {}
+
+    def _calculate_field_blocks(self, start: int, stop: int) -> List[np.ndarray]:
+        blocks = []
+        for matrix, norms in zip(self.data, self.squared_norms):
+            block = get_euclidean_distance_matrix(matrix[start:stop], matrix, norms[start:stop], norms)
+            block[np.arange(stop - start), np.arange(start, stop)] = 0
+            blocks.append(block)
+        return blocks
+
+    def iter_field_blocks(self):
+        if self._blocks is not None:
+            yield from self._blocks
+            return
+
+        cache_size = self.n_points * self.n_points * self.n_fields * np.dtype(np.float32).itemsize
+        keep_blocks = cache_size <= self.cache_memory
+        if not keep_blocks:
+            _logger.info(
+                f"Pairwise distances of {self.n_points} points need {cache_size / 1024 / 1024:.0f} MB, above the "
+                f"cache budget of {self.cache_memory / 1024 / 1024:.0f} MB, they are computed again on every pass"
+            )
+        blocks = []
+        max_distances = np.zeros(self.n_fields, dtype=np.float64)
+        for start in range(0, self.n_points, self.chunk_size):
+            stop = min(start + self.chunk_size, self.n_points)
+            field_blocks = self._calculate_field_blocks(start, stop)
+            for field, block in enumerate(field_blocks):
+                max_distances[field] = max(max_distances[field], float(block.max()))
+            if keep_blocks:
+                blocks.append((start, stop, field_blocks))
+            yield start, stop, field_blocks
+        self._max_distances = max_distances
+        if keep_blocks:
+            self._blocks = blocks
+
+    def get_max_field_distances(self) -> List[float]:
+        # Recorded by the first complete pass over the blocks, whatever asked for it
+        if self._max_distances is None:
+            for _ in self.iter_field_blocks():
+                pass
+        return self._max_distances.tolist()
+
+    def get_approximate_max_field_distances(self, n_sweeps: int = 4):
+        # Farthest point sweeps: if r is the distance from a point to its farthest point, the true maximum
+        # lies in [r, 2r]. Returns the best lower bounds (the estimates) and the matching upper bounds,
+        # so every estimate is guaranteed to be within a factor upper / lower <= 2 of the exact value
+        lower_bounds = []
+        upper_bounds = []
+        for matrix, norms in zip(self.data, self.squared_norms):
+            center = matrix.mean(axis=0, keepdims=True)
+            radius = float(get_euclidean_distance_matrix(center, matrix, second_squared_norms=norms).max())
+            lower, upper = 0.0, 2 * radius
+            point = 0
+            for _ in range(n_sweeps):
+                distances = get_euclidean_distance_matrix(matrix[point:point + 1], matrix, norms[point:point + 1], norms)[0]
+                point = int(distances.argmax())
+                lower = max(lower, float(distances[point]))
+                upper = min(upper, 2 * float(distances[point]))
+            lower_bounds.append(lower)
+            upper_bounds.append(max(upper, lower))
+        return lower_bounds, upper_bounds
+
+    def get_delta_array(self, field_multipliers: List[float], mean_c: int) -> np.ndarray:
+        # Sum of the distances from every point to its mean_c nearest points (itself included)
+        return self.get_delta_arrays(field_multipliers, [mean_c])[mean_c]
+
+    def get_delta_arrays(self, field_multipliers: List[float], mean_cs: List[int]) -> Dict[int, np.ndarray]:
+        # Delta arrays of several mean_c in a single pass over the pairwise distances, the nearest ones are
+        # found by partial selection instead of a full sort. Results are kept, so the engines of a parameter
+        # sweep that share the field multipliers and the number of clusters do not compute them again
+        key = tuple(float(multiplier) for multiplier in field_multipliers)
+        counts = {mean_c: min(max(mean_c, 0), self.n_points) for mean_c in mean_cs}
+        missing = sorted({count for count in counts.values() if count > 0 and (key, count) not in self._delta_arrays})
+        if missing:
+            delta_arrays = {count: np.zeros(self.n_points, dtype=np.float64) for count in missing}
+            largest = missing[-1]
+            for start, stop, field_blocks in self.iter_field_blocks():
+                block = np.zeros((stop - start, self.n_points), dtype=np.float32)
+                for multiplier, field_block in zip(field_multipliers, field_blocks):
+                    block += np.float32(multiplier) * field_block
+                if largest < self.n_points:
+                    block = np.partition(block, largest - 1, axis=1)
+                nearest = block[:, :largest]
+                if len(missing) == 1:
+                    delta_arrays[largest][start:stop] = nearest.sum(axis=1, dtype=np.float64)
+                    continue
+                sums = np.cumsum(np.sort(nearest, axis=1), axis=1, dtype=np.float64)
+                for count in missing:
+                    delta_arrays[count][start:stop] = sums[:, count - 1]
+            for count, delta_array in delta_arrays.items():
+                self._delta_arrays[(key, count)] = delta_array
+
+        return {
+            mean_c: self._delta_arrays[(key, count)] if count > 0 else np.zeros(self.n_points, dtype=np.float64)
+            for mean_c, count in counts.items()
+        }
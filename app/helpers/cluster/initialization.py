@@ -0,0 +1,143 @@
+import math
+from typing import List, Optional
+
+import numpy as np
+
+from app.helpers.cluster.distance_helper import get_distance_matrix, get_squared_norms
+
+# Centroid initialization for the clustering engines. Every method returns the members of each initial
+# cluster as an array of point indices, the centroid of a cluster is the mean of its members, so the
+# point based methods return one member per cluster
+
+default_sample_size = 2048
+default_refine_loops = 5
+
+
+class DistanceHelper:
+    # Distances from every point to a few centroids. They only rank the candidates, so unlike the
+    # engines they are computed in the data type without upcasting the dataset
+    def __init__(self, matrices: List[np.ndarray], field_multipliers: List[float]) -> None:
+        self.data = matrices
+        self.field_multipliers = field_multipliers
+        self.squared_norms = get_squared_norms(matrices)
+        self.n_points = matrices[0].shape[0]
+
+    def to_points(self, indices) -> np.ndarray:
+        indices = np.atleast_1d(indices)
+        return self.to_centroids([matrix[indices] for matrix in self.data])
+
+    def to_centroids(self, centroids: List[np.ndarray]) -> np.ndarray:
+        return get_distance_matrix(
+            self.data,
+            [centroid.astype(matrix.dtype, copy=False) for centroid, matrix in zip(centroids, self.data)],
+            self.field_multipliers,
+            first_squared_norms=self.squared_norms,
+        )
+
+
+def kmeans_plus_plus(
+    matrices: List[np.ndarray],
+    field_multipliers: List[float],
+    n_clusters: int,
+    random_state: Optional[int] = None,
+) -> List[np.ndarray]:
+    # Greedy k-means++: every next centroid is the best of a few candidates sampled with a probability
+    # proportional to the squared distance to the closest centroid already chosen
+    rng = np.random.default_rng(random_state)
+    helper = DistanceHelper(matrices, field_multipliers)
+    n_trials = 2 + int(math.log(n_clusters))
+
+    chosen = [int(rng.integers(helper.n_points))]
+    min_distances = helper.to_points(chosen[0])[:, 0]
+    while len(chosen) < n_clusters:
+        weights = np.square(min_distances)
+        total = weights.sum()
+        if total <= 0:
+            # Every point already sits on a centroid
+            chosen.append(_pick_unchosen(rng, helper.n_points, chosen))
+            continue
+        candidates = rng.choice(helper.n_points, size=n_trials, p=weights / total)
+        candidate_distances = np.minimum(min_distances[:, None], helper.to_points(candidates))
+        best = int(np.square(candidate_distances).sum(axis=0).argmin())
+        chosen.append(int(candidates[best]))
+        min_distances = candidate_distances[:, best]
+    return [np.array([index]) for index in chosen]
+
+
+def farthest_first(
+    matrices: List[np.ndarray],
+    field_multipliers: List[float],
+    n_clusters: int,
+    random_state: Optional[int] = None,
+) -> List[np.ndarray]:
+    # Random first centroid, then always the point farthest from the centroids already chosen
+    rng = np.random.default_rng(random_state)
+    helper = DistanceHelper(matrices, field_multipliers)
+
+    chosen = [int(rng.integers(helper.n_points))]
+    min_distances = helper.to_points(chosen[0])[:, 0]
+    while len(chosen) < n_clusters:
+        farthest = int(min_distances.argmax())
+        if min_distances[farthest] <= 0:
+            farthest = _pick_unchosen(rng, helper.n_points, chosen)
+        chosen.append(farthest)
+        min_distances = np.minimum(min_distances, helper.to_points(farthest)[:, 0])
+    return [np.array([index]) for index in chosen]
+
+
+def sample_refine(
+    matrices: List[np.ndarray],
+    field_multipliers: List[float],
+    n_clusters: int,
+    random_state: Optional[int] = None,
+    sample_size: int = default_sample_size,
+    refine_loops: int = default_refine_loops,
+) -> List[np.ndarray]:
+    # For large datasets: k-means++ on a random sample, refined by a few k-means loops on the sample
+    rng = np.random.default_rng(random_state)
+    n_points = matrices[0].shape[0]
+    sample = np.arange(n_points)
+    if n_points > max(sample_size, n_clusters):
+        sample = np.sort(rng.choice(n_points, size=max(sample_size, n_clusters), replace=False))
+    sample_matrices = [matrix[sample] for matrix in matrices]
+
+    members = kmeans_plus_plus(sample_matrices, field_multipliers, n_clusters, rng)
+    helper = DistanceHelper(sample_matrices, field_multipliers)
+    for _ in range(refine_loops):
+        centroids = [
+            np.array([matrix[member].mean(axis=0, dtype=np.float64) for member in members])
+            for matrix in sample_matrices
+        ]
+        labels = helper.to_centroids(centroids).argmin(axis=1)
+        # A cluster that lost every point keeps its previous members
+        members = [
+            np.flatnonzero(labels == id_cluster) if np.any(labels == id_cluster) else members[id_cluster]
+            for id_cluster in range(n_clusters)
+        ]
+    return [sample[member] for member in members]
+
+
+def _pick_unchosen(rng: np.random.Generator, n_points: int, chosen: List[int]) -> int:
+    candidates = np.setdiff1d(np.arange(n_points), chosen)
+    if len(candidates) == 0:
+        return int(rng.integers(n_points))
+    return int(rng.choice(candidates))
+
+
+initialization_methods = {
+    "kmeans++": kmeans_plus_plus,
+    "farthest_first": farthest_first,
+    "sample_refine": sample_refine,
+}
+
+
+def get_initial_members(
+    method: str,
+    matrices: List[np.ndarray],
+    field_multipliers: List[float],
+    n_clusters: int,
+    random_state: Optional[int] = None,
+) -> List[np.ndarray]:
+    if method not in initialization_methods:
+        raise ValueError(f"Unknown initialization method {method}")
+    return initialization_methods[method](matrices, field_multipliers, n_clusters, random_state)
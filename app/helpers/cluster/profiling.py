@@ -0,0 +1,100 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+_logger = logging.getLogger(__name__)
+
+# Timing of a clustering job: total seconds and calls of every phase, the duration of every loop and
+# counters such as the number of distance evaluations. A cProfile or pyinstrument capture can be taken
+# around a part of the job, its report is kept as text in the summary
+
+default_profile_lines = 40
+
+
+class PhaseTimer:
+    def __init__(self, profiler: Optional[str] = None, profile_lines: int = default_profile_lines) -> None:
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.iterations = []
+        self.profiler_type = profiler
+        self.profile_lines = profile_lines
+        self.profile = None
+        self._profiler = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def add_iteration(self, seconds: float):
+        self.iterations.append(seconds)
+
+    def merge(self, other: "PhaseTimer"):
+        # Phases and counters shared by several jobs, e.g. the data loading of a parameter sweep
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+            self.calls[name] += other.calls[name]
+        for name, value in other.counters.items():
+            self.counters[name] += value
+
+    def start_profile(self):
+        if self.profiler_type is None or self._profiler is not None:
+            return
+        if self.profiler_type == "cprofile":
+            profiler = cProfile.Profile()
+            start = profiler.enable
+        elif self.profiler_type == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                _logger.warning("pyinstrument is not installed, the job is not profiled")
+                return
+            profiler = Profiler()
+            start = profiler.start
+        else:
+            _logger.warning(f"Unknown profiler {self.profiler_type}")
+            return
+        try:
+            start()
+        except (ValueError, RuntimeError) as error:
+            # Only one profiler can be active at a time, e.g. with the configs of a sweep run in parallel
+            _logger.warning(f"The job is not profiled: {error}")
+            return
+        self._profiler = profiler
+
+    def stop_profile(self):
+        if self._profiler is None:
+            return
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(self.profile_lines)
+            self.profile = output.getvalue()
+        else:
+            self._profiler.stop()
+            self.profile = "\n".join(self._profiler.output_text().splitlines()[:self.profile_lines])
+        self._profiler = None
+
+    def get_summary(self) -> dict:
+        return {
+            "phases": {
+                name: {"seconds": seconds, "calls": self.calls[name]}
+                for name, seconds in self.seconds.items()
+            },
+            "iterations": list(self.iterations),
+            "counters": dict(self.counters),
+            "profile": self.profile,
+        }
@@ -0,0 +1,157 @@
+import random
+import numpy as np
+from typing import List, Optional
+
+from app.helpers.cluster.base_cluster import ClusterObject, ClusterService
+from app.helpers.cluster.clustering_helper import ClusteringAlgorithm
+from app.helpers.cluster.assignment import get_assignment, get_cluster_members
+from app.helpers.cluster.initialization import get_initial_members
+from app.helpers.cluster.profiling import PhaseTimer
+from app.helpers.cluster.distance_helper import (
+    PairwiseDistanceCache, get_distance_matrix, get_paired_distances, get_squared_norms, get_weighted_centroids
+)
+
+# Same MC-FMC algorithm as ClusteringAlgorithm, but the dataset is held as one N x D matrix per field
+# and every step is computed as batched matrix operations
+
+
+class VectorizedClusteringAlgorithm(ClusteringAlgorithm):
+    def __init__(
+        self,
+        dataset: List[ClusterObject],
+        model: ClusterService = ClusterService(),
+        n_clusters: int = 3,
+        max_size_cluster: int = 10,
+        upper_m: float = 9.1,
+        lower_m: float = 1.1,
+        alpha: float = 2.0,
+        epsilon: float = 0.001,
+        n_loop: int = 50,
+        loss_tolerance: float = 0,
+        loss_window: int = 3,
+        initial_labels: Optional[List[int]] = None,
+        init_method: str = "kmeans++",
+        random_state: Optional[int] = None,
+        assignment: str = "sequential",
+        chunk_size: Optional[int] = None,
+        distance_cache: Optional[PairwiseDistanceCache] = None,
+        timer: Optional[PhaseTimer] = None,
+    ) -> None:
+        self.data = model.get_data_matrices(dataset)
+        # Reuse the pairwise distances already computed for the field balance when given
+        self.distance_cache = distance_cache or PairwiseDistanceCache(self.data, chunk_size)
+        self.squared_norms = get_squared_norms(self.data, dtype=np.float64)
+        self.field_multipliers = model.get_field_multipliers()
+        self.distances = None
+
+        super().__init__(
+            dataset=dataset,
+            model=model,
+            n_clusters=n_clusters,
+            max_size_cluster=max_size_cluster,
+            upper_m=upper_m,
+            lower_m=lower_m,
+            alpha=alpha,
+            epsilon=epsilon,
+            n_loop=n_loop,
+            loss_tolerance=loss_tolerance,
+            loss_window=loss_window,
+            initial_labels=initial_labels,
+            init_method=init_method,
+            random_state=random_state,
+            assignment=assignment,
+            timer=timer,
+        )
+        self.fuzzi_m = np.array(self.fuzzi_m, dtype=np.float64)
+        self.membership = np.zeros((len(dataset), self.n_clusters), dtype=np.float64)
+
+    def _calculate_delta_array(self, mean_c: int) -> List[float]:
+        return self.distance_cache.get_delta_array(self.field_multipliers, mean_c).tolist()
+
+    def _generate_centroid(self):
+        # Same picks as the reference implementation, without the unused per point distance calls
+        centroid_indices = [random.randint(0, self.n_clusters - 1)]
+        candidate = len(self.dataset) - 1
+        while len(centroid_indices) < self.n_clusters:
+            if candidate not in centroid_indices:
+                centroid_indices.append(candidate)
+            candidate -= 1
+        self.centroid = [matrix[centroid_indices] for matrix in self.data]
+        self.distances = None
+
+    def _get_initial_members(self) -> List[np.ndarray]:
+        return get_initial_members(
+            self.init_method, self.data, self.field_multipliers, self.n_clusters, self.random_state)
+
+    def _generate_centroid_from_members(self, members: List[np.ndarray]):
+        one_hot = np.zeros((len(self.dataset), self.n_clusters), dtype=np.float64)
+        for id_cluster, member in enumerate(members):
+            one_hot[member, id_cluster] = 1
+        self.centroid = get_weighted_centroids(one_hot, self.data)
+        self.distances = None
+
+    def _generate_centroid_from_labels(self):
+        labels = np.asarray(self.initial_labels, dtype=np.int64)
+        one_hot = (labels[:, None] == np.arange(self.n_clusters)[None, :]).astype(np.float64)
+        filled = one_hot.sum(axis=0) > 0
+        centroids = [np.zeros((self.n_clusters, matrix.shape[1]), dtype=matrix.dtype) for matrix in self.data]
+        for centroid, weighted in zip(centroids, get_weighted_centroids(one_hot[:, filled], self.data)):
+            centroid[filled] = weighted
+
+        # Farthest first for the clusters without any point
+        min_distances = get_distance_matrix(
+            self.data, [centroid[filled].astype(np.float64) for centroid in centroids],
+            self.field_multipliers, first_squared_norms=self.squared_norms).min(axis=1)
+        for id_cluster in np.flatnonzero(~filled):
+            farthest = int(min_distances.argmax())
+            for centroid, matrix in zip(centroids, self.data):
+                centroid[id_cluster] = matrix[farthest]
+            new_distances = get_distance_matrix(
+                self.data, [matrix[farthest:farthest + 1].astype(np.float64) for matrix in self.data],
+                self.field_multipliers, first_squared_norms=self.squared_norms)[:, 0]
+            min_distances = np.minimum(min_distances, new_distances)
+        self.centroid = centroids
+        self.distances = None
+
+    def _calculate_centroid_distances(self) -> np.ndarray:
+        # The memberships amplify the relative error of the distances by 2 / (m - 1), so the
+        # point to centroid expansion runs in float64 even when the dataset is stored in float32
+        centroid = [matrix.astype(np.float64) for matrix in self.centroid]
+        self.timer.count("distance_evaluations", len(self.dataset) * self.n_clusters)
+        distances = get_distance_matrix(
+            self.data, centroid, self.field_multipliers, first_squared_norms=self.squared_norms)
+        distances[distances == 0] = self.epsilon
+        return distances
+
+    def _update_membership(self):
+        if self.distances is None:
+            self.distances = self._calculate_centroid_distances()
+
+        # u_ik = 1 / sum_j (d_ik / d_ij)^(2 / (m_i - 1)), computed as a softmax in log space
+        fuzzi_m_pow = 2 / (self.fuzzi_m - 1)
+        exponent = -fuzzi_m_pow[:, None] * np.log(self.distances)
+        exponent -= exponent.max(axis=1, keepdims=True)
+        membership = np.exp(exponent)
+        membership /= membership.sum(axis=1, keepdims=True)
+        self.membership = membership
+
+    def _update_centroid(self):
+        uik_pow = np.power(self.membership, self.fuzzi_m[:, None])
+        th_centroid = get_weighted_centroids(uik_pow, self.data)
+
+        moved = get_paired_distances(self.centroid, th_centroid, self.field_multipliers)
+        self.timer.count("distance_evaluations", self.n_clusters)
+        moved[moved == 0] = self.epsilon
+        if np.any(moved > self.epsilon):
+            self.is_stop = False
+
+        self.centroid = th_centroid
+        self.distances = self._calculate_centroid_distances()
+
+    def _calculate_loss_function(self):
+        uik_pow = np.power(self.membership, self.fuzzi_m[:, None])
+        self.loss_values.append(float(np.sum(uik_pow * np.square(self.distances))))
+
+    def _assign_labels(self):
+        labels = get_assignment(self.assignment, self.membership, self.max_size_cluster)
+        self.pred_labels = get_cluster_members(labels, self.n_clusters)
@@ -0,0 +1,33 @@
+from typing import List, Optional
+
+# Aggregation reading a single result of a history, the other results never leave the database.
+# The position is resolved on the server: index (negative counts from the end), else chosen_loop, else
+# the last result. A position past the stored results matches no result and result is then missing
+
+results_size = {"$size": "$clusters"}
+
+
+def get_result_position(index: Optional[int] = None) -> dict:
+    if index is not None and index >= 0:
+        return {"$literal": index}
+    if index is not None:
+        from_end = {"$add": [results_size, index]}
+        # Below -total_results, $arrayElemAt would count from the end again
+        return {"$cond": [{"$gte": [from_end, 0]}, from_end, results_size]}
+    # A chosen_loop past the stored results falls back to the last one
+    chosen = {"$ifNull": ["$chosen_loop", -1]}
+    return {"$cond": [
+        {"$and": [{"$gte": [chosen, 0]}, {"$lt": [chosen, results_size]}]}, chosen, {"$subtract": [results_size, 1]}
+    ]}
+
+
+def get_result_pipeline(fields: List[str], index: Optional[int] = None) -> List[dict]:
+    return [
+        {"$addFields": {"total_results": results_size, "result_index": get_result_position(index)}},
+        {"$project": {
+            **{field: 1 for field in fields},
+            "total_results": 1,
+            "result_index": 1,
+            "result": {"$arrayElemAt": ["$clusters", "$result_index"]},
+        }},
+    ]
@@ -0,0 +1,108 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.helpers.metrics import embedding_cache_lookups
+
+
+class EmbeddingCache():
+    # Content addressed store of feature vectors: the key is the hash of the model version and the
+    # segmented text. An in-memory LRU tier sits in front of an on-disk sqlite store shared by the
+    # worker processes
+    def __init__(self, model_version: str, cache_dir: Optional[str] = None, memory_size: int = 4096):
+        self.model_version = model_version
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    def get_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_version}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_connection(self):
+        if not self.cache_dir:
+            return None
+        # sqlite connections must not be shared across forked processes
+        if self._connection is None or self._connection_pid != os.getpid():
+            Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                str(Path(self.cache_dir) / "embeddings.sqlite3"), timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._connection.commit()
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        result = {}
+        memory_hits = disk_hits = 0
+        with self._lock:
+            disk_keys = {}
+            for text in texts:
+                key = self.get_key(text)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    result[text] = self._memory[key]
+                    memory_hits += 1
+                else:
+                    disk_keys[key] = text
+
+            connection = self._get_connection()
+            if connection is not None and disk_keys:
+                keys = list(disk_keys.keys())
+                rows = connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(keys))})", keys
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(key, vector)
+                    result[disk_keys.pop(key)] = vector
+                    disk_hits += 1
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(disk_keys)
+        embedding_cache_lookups.labels("memory").inc(memory_hits)
+        embedding_cache_lookups.labels("disk").inc(disk_hits)
+        embedding_cache_lookups.labels("miss").inc(len(disk_keys))
+        return result
+
+    def set_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            rows = []
+            for text, vector in items.items():
+                key = self.get_key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+
+            connection = self._get_connection()
+            if connection is not None and rows:
+                connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                connection.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
@@ -0,0 +1,121 @@
+import logging
+import os
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, \
+        generate_latest, multiprocess
+    metrics_enabled = True
+except ImportError:
+    # The exporter is optional, tools and benchmarks importing the app run without it
+    metrics_enabled = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+    class _NoMetric:
+        def __init__(self, *args, **kwargs) -> None:
+            pass
+
+        def labels(self, *args, **kwargs):
+            return self
+
+        def observe(self, value):
+            pass
+
+        def inc(self, value=1):
+            pass
+
+        @contextmanager
+        def time(self):
+            yield
+
+    Counter = Histogram = _NoMetric
+
+# Metrics of the api and the workers, exposed in the prometheus text format. With several processes
+# (the celery pool children, uvicorn workers) PROMETHEUS_MULTIPROC_DIR must point to an empty directory
+# before the processes start, the metrics of every process are then aggregated from it
+
+long_task_buckets = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 3600)
+
+request_latency = Histogram(
+    "api_request_duration_seconds",
+    "Latency of the api requests",
+    ["method", "route", "status"],
+)
+mongo_command_latency = Histogram(
+    "mongo_command_duration_seconds",
+    "Latency of the mongo commands",
+    ["command", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+celery_task_runtime = Histogram(
+    "celery_task_runtime_seconds",
+    "Runtime of the celery tasks",
+    ["task", "queue", "state"],
+    buckets=long_task_buckets,
+)
+celery_task_queue_wait = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between the publication of a celery task and its start",
+    ["task", "queue"],
+    buckets=long_task_buckets,
+)
+nlp_batch_latency = Histogram(
+    "nlp_batch_duration_seconds",
+    "Latency of one batch through the PhoBERT model",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+nlp_lines = Counter(
+    "nlp_lines",
+    "Lines run through the PhoBERT model",
+)
+embedding_cache_lookups = Counter(
+    "embedding_cache_lookups",
+    "Lookups of the embedding cache by the tier that answered, miss when none did",
+    ["tier"],
+)
+clustering_duration = Histogram(
+    "clustering_duration_seconds",
+    "Duration of the clustering stage of a history",
+    ["engine", "status"],
+    buckets=long_task_buckets,
+)
+clustering_phase_seconds = Counter(
+    "clustering_phase_seconds",
+    "Time spent in every phase of the clustering jobs",
+    ["phase"],
+)
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def get_registry():
+    if not is_multiprocess():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def get_metrics_output() -> bytes:
+    if not metrics_enabled:
+        _logger.warning("prometheus-client is not installed, no metric is exported")
+        return b""
+    return generate_latest(get_registry())
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # Latency of every command of a mongo client, given to the client as an event listener
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_latency.labels(event.command_name, "succeeded").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_command_latency.labels(event.command_name, "failed").observe(event.duration_micros / 1e6)
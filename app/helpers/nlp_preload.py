@@ -1,3 +1,5 @@
+import gc
+import threading
 from typing import Any, List
 
 import gensim
@@ -6,39 +8,106 @@ import underthesea
 import numpy as np
 from transformers import AutoModel, AutoTokenizer
 
+from app.helpers.embedding_cache import EmbeddingCache
+from app.helpers.metrics import nlp_batch_latency, nlp_lines
+from config.config import settings
+
+max_token_length = 256
+model_path = settings.get("NLP_MODEL_PATH", "model")
+
+
 class NLP():
     phobert: Any = None
     tokenizer: Any = None
     stop_word_data: List[str] = []
+    batch_size: int = settings.get("NLP_BATCH_SIZE", 32)
+    embedding_cache: EmbeddingCache = None
 
     def initialize(self):
         # Load model
-        self.phobert = AutoModel.from_pretrained("model")
-        self.tokenizer = AutoTokenizer.from_pretrained("model")
+        self.phobert = AutoModel.from_pretrained(model_path)
+        self.phobert.eval()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
 
         # Stop word
         fname = 'app/helpers/vn_stopword.txt'
         self.stop_word_data = np.genfromtxt(fname, dtype='str', delimiter='\n', encoding="utf8").tolist()
 
+        # Feature cache
+        self.embedding_cache = EmbeddingCache(
+            model_version=settings.get("NLP_MODEL_VERSION", "phobert-base-v2"),
+            cache_dir=settings.get("EMBEDDING_CACHE_DIR", None),
+            memory_size=settings.get("EMBEDDING_CACHE_MEMORY_SIZE", 4096),
+        )
+
+    @property
+    def is_ready(self) -> bool:
+        return self.phobert is not None and self.tokenizer is not None
+
+    def preprocess_line(self, line) -> str:
+        # Preprocess
+        line = gensim.utils.simple_preprocess(str(line))
+        line = " ".join(line)
+        # Segmentation
+        line = underthesea.word_tokenize(line, format="text")
+        return "".join(line)
+
     def extract_feature(self, lines):
+        return self.extract_feature_batch(lines)
+
+    def extract_feature_batch(self, lines, batch_size: int = None):
+        # Only the segmented texts missing from the embedding cache go through the model
         if not self.phobert or not self.tokenizer:
             print("ohno")
             return None
+        preprocessed_lines = [self.preprocess_line(line) for line in lines]
+        cached_features = self.embedding_cache.get_many(list(set(preprocessed_lines)))
+        missing_lines = [line for line in dict.fromkeys(preprocessed_lines) if line not in cached_features]
+        if missing_lines:
+            new_features = dict(zip(missing_lines, self.run_model(missing_lines, batch_size)))
+            self.embedding_cache.set_many(new_features)
+            cached_features.update(new_features)
+        return [np.asarray(cached_features[line], dtype=np.float32).tolist() for line in preprocessed_lines]
+
+    def run_model(self, preprocessed_lines, batch_size: int = None):
+        # Run many lines through the model at once, shorter lines are padded and masked out
+        batch_size = batch_size or self.batch_size
+        encoded_lines = [
+            self.tokenizer.encode(line)[:max_token_length]
+            for line in preprocessed_lines
+        ]
         features_list = []
-        for line in lines:
-            # Preprocess
-            line = gensim.utils.simple_preprocess(str(line))
-            line = " ".join(line)
-            # Segmentation
-            line = underthesea.word_tokenize(line, format="text")
-            line = "".join(line)
-            # Extract feature
-            input_ids = torch.tensor([self.tokenizer.encode(line)])
-            input_ids = torch.slice_copy(input_ids, 1, 0, 256)
-            with torch.no_grad():
-                features = self.phobert(input_ids)
-            v_features = features[0][:, 0, :]
-            features_list.append(v_features[0].tolist())
+        for start in range(0, len(encoded_lines), batch_size):
+            batch = encoded_lines[start:start + batch_size]
+            max_length = max(len(input_ids) for input_ids in batch)
+            input_ids = torch.full((len(batch), max_length), self.tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), max_length), dtype=torch.long)
+            for index, line_ids in enumerate(batch):
+                input_ids[index, :len(line_ids)] = torch.tensor(line_ids, dtype=torch.long)
+                attention_mask[index, :len(line_ids)] = 1
+            with torch.no_grad(), nlp_batch_latency.time():
+                features = self.phobert(input_ids, attention_mask=attention_mask)
+            nlp_lines.inc(len(batch))
+            features_list.extend(features[0][:, 0, :].tolist())
         return features_list
 
-nlp_service = NLP()
\ No newline at end of file
+# Process wide instance, loaded once and kept warm for every task of the process
+nlp_service = NLP()
+_nlp_service_lock = threading.Lock()
+
+
+def get_nlp_service() -> NLP:
+    if not nlp_service.is_ready:
+        with _nlp_service_lock:
+            if not nlp_service.is_ready:
+                nlp_service.initialize()
+    return nlp_service
+
+
+def preload_for_fork() -> NLP:
+    # Load before the pool forks: children share the weight pages copy-on-write as long as nobody
+    # writes to them, and freezing the gc keeps collections from touching the parent objects
+    get_nlp_service()
+    torch.set_grad_enabled(False)
+    gc.freeze()
+    return nlp_service
@@ -0,0 +1,69 @@
+import json
+import struct
+from typing import Tuple
+
+import numpy as np
+
+# Binary frame for the internal api: magic, version, length of a json header, the json header and
+# a little endian float32 block whose shape is stored in the header
+vector_content_type = "application/x-thesis-vectors"
+frame_magic = b"TVEC"
+frame_version = 1
+frame_prefix = struct.Struct("<4sBI")
+
+
+def encode_vector_frame(header: dict, vectors) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    header = dict(header, shape=list(vectors.shape))
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return frame_prefix.pack(frame_magic, frame_version, len(header_bytes)) + header_bytes + vectors.tobytes()
+
+
+def decode_vector_frame(content: bytes) -> Tuple[dict, np.ndarray]:
+    if len(content) < frame_prefix.size:
+        raise ValueError("Vector frame is too short")
+    magic, version, header_length = frame_prefix.unpack_from(content)
+    if magic != frame_magic or version != frame_version:
+        raise ValueError("Unknown vector frame format")
+    header_end = frame_prefix.size + header_length
+    header = json.loads(content[frame_prefix.size:header_end].decode("utf-8"))
+    shape = tuple(header.pop("shape"))
+    vectors = np.frombuffer(content, dtype="<f4", offset=header_end)
+    if vectors.size != int(np.prod(shape)):
+        raise ValueError("Vector frame size does not match its shape")
+    return header, vectors.reshape(shape)
+
+
+def is_vector_content(content_type: str) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip() == vector_content_type
+
+
+# Packed storage of one vector: magic, dtype code, number of dimensions, the shape and the raw
+# little endian values
+packed_magic = b"PV"
+packed_prefix = struct.Struct("<2scB")
+packed_dtypes = {
+    "float32": (b"f", "<f4"),
+    "float16": (b"e", "<f2"),
+}
+packed_codes = {code: dtype for code, dtype in packed_dtypes.values()}
+
+
+def pack_vector(vector, dtype: str = "float32") -> bytes:
+    code, numpy_dtype = packed_dtypes[dtype]
+    vector = np.ascontiguousarray(vector, dtype=numpy_dtype)
+    return (
+        packed_prefix.pack(packed_magic, code, vector.ndim)
+        + struct.pack(f"<{vector.ndim}I", *vector.shape)
+        + vector.tobytes()
+    )
+
+
+def unpack_vector(content: bytes) -> np.ndarray:
+    magic, code, ndim = packed_prefix.unpack_from(content)
+    if magic != packed_magic or code not in packed_codes:
+        raise ValueError("Unknown packed vector format")
+    shape = struct.unpack_from(f"<{ndim}I", content, packed_prefix.size)
+    offset = packed_prefix.size + 4 * ndim
+    vector = np.frombuffer(content, dtype=packed_codes[code], offset=offset).reshape(shape)
+    return vector.astype(np.float32, copy=False)
@@ -0,0 +1,42 @@
+import struct
+from typing import List, Type, TypeVar
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+
+from app.helpers.vector_codec import decode_vector_frame, is_vector_content, vector_content_type
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+def parse_vector_body(body: bytes, content_type: str, model: Type[Model], vector_fields: List[str]) -> Model:
+    # Binary vector frame with one vector per field in order, json body otherwise. A malformed body
+    # answers 422 like the bodies fastapi validates itself
+    try:
+        if is_vector_content(content_type):
+            try:
+                _, vectors = decode_vector_frame(body)
+            except (ValueError, KeyError, struct.error) as error:
+                raise RequestValidationError([ErrorWrapper(error, loc=("body",))])
+            if len(vectors) != len(vector_fields):
+                raise RequestValidationError([ErrorWrapper(
+                    ValueError(f"Vector frame has {len(vectors)} vectors instead of {len(vector_fields)}"), loc=("body",)
+                )])
+            return model(**{field: vectors[index].tolist() for index, field in enumerate(vector_fields)})
+        return model.parse_raw(body)
+    except ValidationError as error:
+        raise RequestValidationError(error.raw_errors)
+
+
+def get_vector_body_openapi(model: Type[BaseModel]) -> dict:
+    # The body is read from the request, so both content types are documented by hand
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": model.schema()},
+                vector_content_type: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    }
@@ -0,0 +1,29 @@
+import time
+
+from fastapi import FastAPI, Request
+from starlette.routing import Match
+
+from app.helpers.metrics import request_latency
+
+
+def get_route_path(request: Request) -> str:
+    # Path template of the matched route, so the ids in the urls do not create a label each
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+def add_metrics(app: FastAPI):
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        route = get_route_path(request)
+        status = 500
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            request_latency.labels(request.method, route, str(status)).observe(time.perf_counter() - start)
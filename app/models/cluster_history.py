@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from pydantic import BaseModel
 
@@ -21,6 +21,7 @@ class ClusterGroupData(BaseModel):
 class ClusterPartialResult(BaseModel):
     # Cluster result for a certain loop, last partial result is the final
     result_cluster: List[ClusterGroupData]
+    loop: Optional[int]
 
 
 class JobStatusType(str, RootEnum):
@@ -31,12 +32,57 @@ class JobStatusType(str, RootEnum):
     FINISHED = "FINISHED"
 
 
+class ClusterEngineType(str, RootEnum):
+    REFERENCE = "reference"
+    VECTORIZED = "vectorized"
+
+
+class ClusterInitMethod(str, RootEnum):
+    LEGACY = "legacy"
+    KMEANS_PLUS_PLUS = "kmeans++"
+    FARTHEST_FIRST = "farthest_first"
+    SAMPLE_REFINE = "sample_refine"
+
+
+class ClusterAssignmentType(str, RootEnum):
+    SEQUENTIAL = "sequential"
+    GLOBAL_GREEDY = "global_greedy"
+    AUCTION = "auction"
+
+
+class ClusterProfilerType(str, RootEnum):
+    CPROFILE = "cprofile"
+    PYINSTRUMENT = "pyinstrument"
+
+
+class ClusterPhaseTiming(BaseModel):
+    seconds: float
+    calls: int
+
+
+class ClusterTiming(BaseModel):
+    # Where the time of the clustering job went, sent by the worker once the job is over
+    phases: Dict[str, ClusterPhaseTiming] = {}
+    iterations: List[float] = []
+    counters: Dict[str, int] = {}
+    profile: Optional[str]
+
+
 class ClusterJobStatus(BaseModel):
     total_done_nlp: int
     total_thesis: int
     status: JobStatusType
 
 
+class ClusterSweepGrid(BaseModel):
+    # Values tried for every parameter, an empty list keeps the value of the config
+    number_of_clusters: List[int] = []
+    max_item_each_cluster: List[int] = []
+    upper_m: List[float] = []
+    lower_m: List[float] = []
+    alpha: List[float] = []
+
+
 class ClusterConfig(BaseModel):
     order: list = [0, 1, 2, 3]
     number_of_clusters: int = 10
@@ -45,6 +91,25 @@ class ClusterConfig(BaseModel):
     upper_m: float = 1.1
     lower_m: float = 9.1
     alpha: float = 2.0
+    engine: ClusterEngineType = ClusterEngineType.VECTORIZED
+    approximate_field_balance: bool = False
+    init_method: ClusterInitMethod = ClusterInitMethod.KMEANS_PLUS_PLUS
+    random_state: Optional[int]
+    assignment: ClusterAssignmentType = ClusterAssignmentType.SEQUENTIAL
+    # Result emission policy: every emit_every loops, after emit_interval seconds or when the ratio of
+    # points that changed cluster reaches emit_label_change (0 disables the last two)
+    emit_every: int = 1
+    emit_interval: float = 0
+    emit_label_change: float = 0
+    # Early stop once the relative loss change stays below loss_tolerance for loss_window loops (0 disables)
+    loss_tolerance: float = 0
+    loss_window: int = 3
+    # Seed the centroids with the final clusters of a previous history
+    warm_start_history_id: Optional[str]
+    # Runs one history for every combination of the grid in a single worker job
+    sweep: Optional[ClusterSweepGrid]
+    # Profiles the clustering stage, the report is stored in the timing of the history
+    profiler: Optional[ClusterProfilerType]
 
 
 class ClusterHistory(RootModel):
@@ -54,9 +119,16 @@ class ClusterHistory(RootModel):
     name: str
     description: Optional[str]
     clusters: List[ClusterPartialResult]
+    # Index in clusters of the result picked by the user, not a loop number: when the results are
+    # throttled the loop of a result is only in ClusterPartialResult.loop
     chosen_loop: Optional[int]
     loss_values: List[float]
     non_clustered_thesis: List[MinimumThesisData]
     updated_at: datetime
     cluster_job_status: ClusterJobStatus
-    config: ClusterConfig
\ No newline at end of file
+    config: ClusterConfig
+    # Histories started by the same parameter sweep share the sweep id
+    sweep_id: Optional[str]
+    # Last loss value of the results, to compare the histories of a sweep
+    final_loss: Optional[float]
+    timing: Optional[ClusterTiming]
\ No newline at end of file
@@ -1,9 +1,44 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional
+import numpy as np
+from bson import Binary
 from pydantic import BaseModel
 from pymongo import ASCENDING, IndexModel
 
+from app.helpers.vector_codec import pack_vector, unpack_vector
 from app.models.base import RootModel
+from config.config import settings
+
+vector_storage_dtype = settings.get("VECTOR_STORAGE_DTYPE", "float32")
+vector_fields = ["title_vector", "category_vector", "expected_result_vector", "problem_solve_vector"]
+
+
+def encode_packed_vector(vector: np.ndarray) -> Binary:
+    return Binary(pack_vector(vector, vector_storage_dtype))
+
+
+class PackedVector:
+    # Embedding stored as packed float32 / float16 bson binary, read back as a float32 array.
+    # Documents written before the packed format still hold plain float arrays and are accepted as is
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value):
+        if isinstance(value, (bytes, Binary)):
+            return unpack_vector(bytes(value))
+        return np.asarray(value, dtype=np.float32)
+
+    @classmethod
+    def __modify_schema__(cls, field_schema):
+        field_schema.update(type="array", items={"type": "number"})
+
+
+# Json encoders of the models that return the vectors, as lists of floats
+vector_json_encoders = {
+    np.ndarray: lambda vector: vector.tolist(),
+}
 
 
 class ThesisStudentData(BaseModel):
@@ -14,13 +49,13 @@ class ThesisStudentData(BaseModel):
 class ThesisDataInput(BaseModel):
     semester: str
     title: str
-    title_vector: Optional[List]
+    title_vector: Optional[PackedVector]
     category: str
-    category_vector: Optional[List]
+    category_vector: Optional[PackedVector]
     expected_result: str
-    expected_result_vector: Optional[List]
+    expected_result_vector: Optional[PackedVector]
     problem_solve: str
-    problem_solve_vector: Optional[List]
+    problem_solve_vector: Optional[PackedVector]
     student_data: ThesisStudentData
     
 
@@ -42,7 +77,10 @@ class ThesisData(RootModel, ThesisDataInput):
                 unique=True,
             )
         ]
+        bson_encoders = {
+            np.ndarray: encode_packed_vector,
+        }
 
     updated_at: datetime
     need_nlp_extract: bool = True
-    nlp_job_id: Optional[str]
\ No newline at end of file
+    nlp_job_id: Optional[str]
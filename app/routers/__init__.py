@@ -1,4 +1,4 @@
-from .health import ping
+from .health import ping, metrics
 from .auth import auth_routes
 from .clustering import clustering_routes
 from .cluster_history import cluster_history_routes, internal_cluster_history_routes
@@ -21,6 +21,9 @@ routers = []
 routers.append({
     'router': ping.router
 })
+routers.append({
+    'router': metrics.router
+})
 add_routes(auth_routes, routers, [], False)
 add_routes(clustering_routes, routers, [], False)
 add_routes(cluster_history_routes, routers, [], False)
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Query, Depends
+from fastapi.responses import StreamingResponse
 from app.dto.common import BaseResponse
 from app.helpers.auth_helpers import get_current_user
-from app.dto.cluster_history_dto import (ClusterHistoryResponse, ClusterHistoryPaginationData, ClusterHistoryPaginationResponse, ClusterHistoryPutRequest)
+from app.dto.cluster_history_dto import (ClusterHistoryResponse, ClusterHistoryPaginationData, ClusterHistoryPaginationResponse, ClusterHistoryPutRequest,
+    ClusterJobProgressResponse, ClusterSweepResponse, ClusterHistoryResultResponse, ClusterResultPaginationData,
+    ClusterResultPaginationResponse)
 from app.services.cluster_history_service import ClusterHistoryService
 
 
@@ -33,6 +36,24 @@ async def get_list_cluster_history(
     )
 
 
+@route.get(
+    '/sweep/{sweep_id}',
+    response_model=ClusterSweepResponse
+)
+async def get_sweep_histories(
+    sweep_id: str,
+    user: str = Depends(get_current_user),
+):
+    histories = await ClusterHistoryService().get_sweep(
+        sweep_id=sweep_id,
+    )
+
+    return ClusterSweepResponse(
+        message="Get sweep histories successfully",
+        data=histories
+    )
+
+
 @route.get(
     '/{cluster_history_id}',
 )
@@ -50,6 +71,83 @@ async def get_history_by_id(
     )
 
 
+@route.get(
+    '/{cluster_history_id}/result',
+    response_model=ClusterHistoryResultResponse
+)
+async def get_history_result_by_id(
+    cluster_history_id: str,
+    user: str = Depends(get_current_user),
+    index: int = Query(None, description="Index of the result, negative counts from the end. The chosen result, else the last, when unset"),
+):
+    history_result = await ClusterHistoryService().get_result(
+        cluster_history_id=cluster_history_id,
+        index=index,
+    )
+
+    return ClusterHistoryResultResponse(
+        message="Get history result successfully",
+        data=history_result
+    )
+
+
+@route.get(
+    '/{cluster_history_id}/results',
+    response_model=ClusterResultPaginationResponse
+)
+async def get_history_results_by_id(
+    cluster_history_id: str,
+    user: str = Depends(get_current_user),
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1),
+):
+    items, total = await ClusterHistoryService().list_results(
+        cluster_history_id=cluster_history_id,
+        page=page,
+        limit=limit,
+    )
+
+    return ClusterResultPaginationResponse(
+        message="Get history results successfully",
+        data=ClusterResultPaginationData(
+            items=items,
+            total=total,
+        )
+    )
+
+
+@route.get(
+    '/{cluster_history_id}/results/stream',
+)
+async def stream_history_results_by_id(
+    cluster_history_id: str,
+    user: str = Depends(get_current_user),
+):
+    # One json result per line, in the order they were stored
+    results = await ClusterHistoryService().stream_results(
+        cluster_history_id=cluster_history_id,
+    )
+    return StreamingResponse(results, media_type="application/x-ndjson")
+
+
+@route.get(
+    '/{cluster_history_id}/status',
+    response_model=ClusterJobProgressResponse
+)
+async def get_history_status_by_id(
+    cluster_history_id: str,
+    user: str = Depends(get_current_user),
+):
+    job_progress = await ClusterHistoryService().get_status(
+        cluster_history_id=cluster_history_id,
+    )
+
+    return ClusterJobProgressResponse(
+        message="Get history status successfully",
+        data=job_progress
+    )
+
+
 @route.put(
     '/{cluster_history_id}',
 )
@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+import numpy as np
+from fastapi import APIRouter, Request, Response
+from fastapi.encoders import jsonable_encoder
 from app.dto.common import BaseResponse
-from app.dto.cluster_history_dto import WorkerClusterHistoryResponse, ClusterHistoryResultPutRequest, ClusterHistoryStatusPutRequest
+from app.dto.cluster_history_dto import WorkerClusterHistoryResponse, ClusterHistoryResultPutRequest, ClusterHistoryStatusPutRequest, \
+    NlpPendingThesisResponse, ClusterJobProgressResponse, ClusterHistoryTimingPutRequest, ClusterJobClaimResponse
+from app.helpers.vector_codec import encode_vector_frame, vector_content_type
 from app.services.cluster_history_service import ClusterHistoryService
 
 
@@ -13,15 +17,80 @@ internal_route = APIRouter(tags=['Cluster History'], prefix="/cluster_history")
 )
 async def get_worker_data(
     history_id: str,
+    request: Request,
 ):
     data = await ClusterHistoryService().get_worker_data(history_id=history_id)
-    
+
+    if vector_content_type in request.headers.get("accept", ""):
+        # Vectors of the non clustered theses in order as one (N, 4, D) float32 block
+        header = jsonable_encoder(WorkerClusterHistoryResponse(
+            message="Get worker data successfully",
+            data=data.copy(update={"detail_thesis_dict": None})
+        ))
+        vectors = np.zeros((0, 4, 0), dtype=np.float32)
+        if data.detail_thesis_dict:
+            vectors = np.array([
+                [
+                    thesis.title_vector,
+                    thesis.category_vector,
+                    thesis.expected_result_vector,
+                    thesis.problem_solve_vector,
+                ]
+                for thesis in (data.detail_thesis_dict[item.thesis_id] for item in data.non_clustered_thesis)
+            ], dtype=np.float32)
+        return Response(content=encode_vector_frame(header, vectors), media_type=vector_content_type)
+
     return WorkerClusterHistoryResponse(
         message="Get worker data successfully",
         data=data
     )
 
 
+@internal_route.get(
+    "/{history_id}/status",
+    response_model=ClusterJobProgressResponse
+)
+async def get_history_job_status(
+    history_id: str,
+):
+    data = await ClusterHistoryService().get_status(cluster_history_id=history_id)
+
+    return ClusterJobProgressResponse(
+        message="Get status successfully",
+        data=data
+    )
+
+
+@internal_route.put(
+    "/{history_id}/clustering_claim",
+    response_model=ClusterJobClaimResponse
+)
+async def claim_history_clustering(
+    history_id: str,
+):
+    data = await ClusterHistoryService().claim_clustering(history_id=history_id)
+
+    return ClusterJobClaimResponse(
+        message="Claim clustering successfully",
+        data=data
+    )
+
+
+@internal_route.get(
+    "/{history_id}/nlp_pending",
+    response_model=NlpPendingThesisResponse
+)
+async def get_pending_nlp_thesis(
+    history_id: str,
+):
+    data = await ClusterHistoryService().get_pending_nlp(history_id=history_id)
+
+    return NlpPendingThesisResponse(
+        message="Get pending nlp thesis successfully",
+        data=data
+    )
+
+
 @internal_route.put(
     "/{history_id}/cluster_result",
     response_model=BaseResponse
@@ -49,8 +118,26 @@ async def update_history_job_status(
 ):
     await ClusterHistoryService().update_status(
         history_id=history_id,
-        status=data.status
+        status=data.status,
+        whole_job=data.whole_job
     )
     return BaseResponse(
         message="Update status successfully"
-    )
\ No newline at end of file
+    )
+
+
+@internal_route.put(
+    "/{history_id}/timing",
+    response_model=BaseResponse
+)
+async def update_history_timing(
+    history_id: str,
+    data: ClusterHistoryTimingPutRequest
+):
+    await ClusterHistoryService().update_timing(
+        history_id=history_id,
+        timing=data
+    )
+    return BaseResponse(
+        message="Update timing successfully"
+    )
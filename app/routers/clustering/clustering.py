@@ -33,6 +33,17 @@ async def init_clustering(
     config_data = data.config
     parse_config_data = ClusterConfig(**config_data.dict())
 
+    if parse_config_data.sweep is not None:
+        # The first history of the sweep is returned, the others are listed by its sweep_id
+        histories = await ClusterHistoryService().create_sweep(
+            config=parse_config_data,
+            thesis_list=thesis_list
+        )
+        return ClusterHistoryCreateResponse(
+            message=f"Start a clustering sweep of {len(histories)} configurations successfully",
+            data=ShortClusterHistory(_id=histories[0].id,**histories[0].dict())
+        )
+
     history = await ClusterHistoryService().create_history(
         config=parse_config_data,
         thesis_list=thesis_list
@@ -52,7 +63,10 @@ async def get_cluster_name_suggestion(
     data: ClusterNameSuggestionRequest,
     user: str = Depends(get_current_user),
 ):
-    suggestions = await ThesisDataService().suggest_cluster_name(data.thesis_list_id)
+    if data.cluster_list_ids is not None:
+        suggestions = await ThesisDataService().suggest_cluster_names(data.cluster_list_ids)
+    else:
+        suggestions = await ThesisDataService().suggest_cluster_name(data.thesis_list_id)
     return ClusterNameSuggestionResponse(
         message="Get name suggestion successfully",
         data=suggestions
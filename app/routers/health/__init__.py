@@ -1 +1 @@
-from . import ping
\ No newline at end of file
+from . import ping, metrics
\ No newline at end of file
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+
+from app.helpers.metrics import CONTENT_TYPE_LATEST, get_metrics_output
+
+
+router = APIRouter(tags=['Metrics'])
+
+
+@router.get(
+    '/metrics',
+    include_in_schema=False
+)
+async def get_metrics():
+    return Response(content=get_metrics_output(), media_type=CONTENT_TYPE_LATEST)
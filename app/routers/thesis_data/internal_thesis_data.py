@@ -1,18 +1,28 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request
 from app.dto.common import BaseResponse
 from app.dto.thesis_data_dto import ThesisDataUpdateNlpRequest
+from app.helpers.vector_request import get_vector_body_openapi, parse_vector_body
+from app.services.cluster_history_service import ClusterHistoryService
 from app.services.thesis_data_service import ThesisDataService
 
 internal_route = APIRouter(tags=['Thesis Data'], prefix="/thesis_data")
+nlp_vector_fields = ["title_vector", "category_vector", "expected_result_vector", "problem_solve_vector"]
+
+
+async def parse_update_nlp_request(request: Request) -> ThesisDataUpdateNlpRequest:
+    # Binary vector frame when the worker sends one, json body otherwise
+    body = await request.body()
+    return parse_vector_body(body, request.headers.get("content-type"), ThesisDataUpdateNlpRequest, nlp_vector_fields)
 
 
 @internal_route.put(
     '/{thesis_id}/update_nlp',
-    response_model=BaseResponse
+    response_model=BaseResponse,
+    openapi_extra=get_vector_body_openapi(ThesisDataUpdateNlpRequest)
 )
 async def update_thesis_nlp_data(
     thesis_id: str,
-    data: ThesisDataUpdateNlpRequest,
+    data: ThesisDataUpdateNlpRequest = Depends(parse_update_nlp_request),
 ):
     await ThesisDataService().update_nlp(
         thesis_id=thesis_id,
@@ -21,6 +31,7 @@ async def update_thesis_nlp_data(
         expected_result_vector=data.expected_result_vector,
         problem_solve_vector=data.problem_solve_vector
     )
+    await ClusterHistoryService().start_ready_jobs(thesis_id=thesis_id)
 
     return BaseResponse(
         message=f"Update nlp successfully for thesis id {thesis_id}"
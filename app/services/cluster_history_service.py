@@ -1,22 +1,39 @@
-from datetime import datetime, timedelta
+import itertools
+from datetime import datetime
 from typing import Optional, List
 
 from beanie import PydanticObjectId
 from beanie.operators import RegEx, In, Set
-from celery.result import AsyncResult
 
-from app.helpers.exceptions import NotFoundException
-from app.dto.thesis_data_dto import ShortThesisData
+from app.helpers.cluster_results import get_result_pipeline
+from app.helpers.exceptions import NotFoundException, BadRequestException, ConflictException
+from app.dto.thesis_data_dto import ShortThesisData, ThesisMetadata, ThesisNlpState, ThesisVectors
 from app.dto.cluster_history_dto import ClusterHistoryPutRequest, ShortClusterHistory, FullClusterHistory, \
-    WorkerClusterHistory, ClusterHistoryResultPutRequest
+    WorkerClusterHistory, ClusterHistoryResultPutRequest, NlpPendingThesis, ClusterHistoryStatus, ClusterJobProgress, \
+    ClusterHistoryThesisList, ClusterSweepVariant, SweepClusterHistory, ClusterHistoryTimingPutRequest, \
+    ClusterHistoryResult, ClusterResultPage, ClusterResultItem, ClusterHistoryJob, ClusterJobClaim, ClusterHistoryJobTheses, \
+    ClusterHistoryJobConfig
 from app.models.cluster_history import ClusterHistory, MinimumThesisData, ClusterJobStatus, JobStatusType, \
     ClusterConfig, ClusterGroupData, ClusterPartialResult
 from app.services.thesis_data_service import ThesisDataService
-from app.worker.tasks.nlp_task import schedule_preprocess
-from app.worker.tasks.clustering_task import schedule_clustering
+from app.worker.tasks.clustering_task import schedule_clustering, start_clustering
+from config.config import settings
 import logging
 
 _logger = logging.getLogger(__name__)
+sweep_max_variants = settings.get("CLUSTER_SWEEP_MAX_VARIANTS", 32)
+# Results read from the database at a time when the results of a history are streamed
+result_stream_batch = settings.get("CLUSTER_RESULT_STREAM_BATCH", 10)
+# Fields of a history returned with a single result
+history_result_fields = [
+    "name", "description", "created_at", "updated_at", "cluster_job_status", "sweep_id", "final_loss",
+    "chosen_loop", "non_clustered_thesis", "config",
+]
+# Histories whose nlp stage is done but whose clustering is not started yet
+ready_job_query = {
+    "cluster_job_status.status": JobStatusType.WAITING_NLP,
+    "$expr": {"$gte": ["$cluster_job_status.total_done_nlp", "$cluster_job_status.total_thesis"]},
+}
 
 
 def parse_thesis_data_to_minimum_data(thesis: ShortThesisData):
@@ -28,6 +45,42 @@ def parse_thesis_data_to_minimum_data(thesis: ShortThesisData):
     )
     return parse_thesis
 
+
+def new_history(
+    config: ClusterConfig,
+    minimum_thesis_list: List[MinimumThesisData],
+    name: str = "New cluster history",
+    sweep_id: Optional[str] = None,
+):
+    return ClusterHistory(
+        name=name,
+        clusters=[],
+        non_clustered_thesis=minimum_thesis_list,
+        loss_values=[],
+        updated_at=datetime.utcnow(),
+        cluster_job_status=ClusterJobStatus(total_done_nlp=0, total_thesis=len(minimum_thesis_list), status=JobStatusType.PENDING),
+        config=config,
+        sweep_id=sweep_id
+    )
+
+
+def get_sweep_configs(config: ClusterConfig) -> List[ClusterConfig]:
+    # One config for every combination of the sweep grid, the other fields are shared
+    base_config = config.dict(exclude={"sweep"})
+    grid = {key: values for key, values in config.sweep.dict().items() if values}
+    sweep_configs = []
+    for values in itertools.product(*grid.values()):
+        sweep_configs.append(ClusterConfig(**dict(base_config, **dict(zip(grid.keys(), values)))))
+    return sweep_configs
+
+
+def get_job_query(cluster_history) -> dict:
+    # The nlp stage and the data of a sweep are shared, so its job status is set on every history of the sweep
+    if cluster_history.sweep_id:
+        return {"sweep_id": cluster_history.sweep_id}
+    return {"_id": cluster_history.id}
+
+
 class ClusterHistoryService:
     async def list_history(
         self,
@@ -55,6 +108,80 @@ class ClusterHistoryService:
         return cluster_history
 
 
+    async def get_result(
+        self,
+        cluster_history_id: str,
+        index: Optional[int] = None,
+    ):
+        histories = await ClusterHistory.find_many({'_id': PydanticObjectId(cluster_history_id)}).aggregate(
+            get_result_pipeline(history_result_fields, index), projection_model=ClusterHistoryResult
+        ).to_list()
+        if not histories:
+            raise NotFoundException("No cluster history")
+        history = histories[0]
+        if history.result is None:
+            if index is not None:
+                raise NotFoundException("No cluster result")
+            # No result stored yet
+            history.result_index = None
+        return history
+
+
+    async def list_results(
+        self,
+        cluster_history_id: str,
+        page: int = 1,
+        limit: int = 10,
+    ):
+        skip = limit * (page - 1)
+        pages = await ClusterHistory.find_many({'_id': PydanticObjectId(cluster_history_id)}).aggregate([
+            {"$project": {
+                "total": {"$size": "$clusters"},
+                "items": {"$slice": ["$clusters", skip, limit]},
+            }},
+        ], projection_model=ClusterResultPage).to_list()
+        if not pages:
+            raise NotFoundException("No cluster history")
+        items = [ClusterResultItem(**item.dict(), index=skip + offset) for offset, item in enumerate(pages[0].items)]
+        return items, pages[0].total
+
+
+    async def stream_results(
+        self,
+        cluster_history_id: str,
+    ):
+        # The first batch is read here so a missing history fails before the response starts, the
+        # other batches are read while the stream is sent. Results stored meanwhile are not included
+        items, total = await self.list_results(cluster_history_id, page=1, limit=result_stream_batch)
+
+        async def iterate():
+            batch = items
+            page = 1
+            while batch:
+                for item in batch:
+                    if item.index >= total:
+                        return
+                    yield item.json() + "\n"
+                page += 1
+                batch, _ = await self.list_results(cluster_history_id, page=page, limit=result_stream_batch)
+
+        return iterate()
+
+
+    async def get_status(
+        self,
+        cluster_history_id: str
+    ):
+        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(cluster_history_id)}).project(ClusterHistoryStatus)
+        if not cluster_history:
+            raise NotFoundException("No cluster history")
+        job_status = cluster_history.cluster_job_status
+        return ClusterJobProgress(
+            **job_status.dict(),
+            ready_for_cluster=job_status.total_done_nlp >= job_status.total_thesis
+        )
+
+
     async def create_history(
         self,
         config: ClusterConfig = ClusterConfig(),
@@ -63,19 +190,51 @@ class ClusterHistoryService:
         minimum_thesis_list: List[MinimumThesisData] = []
         for thesis in thesis_list:
             minimum_thesis_list.append(parse_thesis_data_to_minimum_data(thesis))
-        new_history = ClusterHistory(
-            name="New cluster history",
-            clusters=[],
-            non_clustered_thesis=minimum_thesis_list,
-            loss_values=[],
-            updated_at=datetime.utcnow(),
-            cluster_job_status=ClusterJobStatus(total_done_nlp=0, total_thesis=len(minimum_thesis_list), status=JobStatusType.PENDING),
-            config=config
-        )
-        await new_history.save()
-        schedule_clustering(str(new_history.id))
-        return new_history
-    
+        history = new_history(config, minimum_thesis_list)
+        await history.save()
+        schedule_clustering(str(history.id))
+        return history
+
+
+    async def create_sweep(
+        self,
+        config: ClusterConfig,
+        thesis_list: List[ShortThesisData] = [],
+    ):
+        sweep_configs = get_sweep_configs(config)
+        if len(sweep_configs) > sweep_max_variants:
+            raise BadRequestException(f"A sweep runs at most {sweep_max_variants} configurations")
+        minimum_thesis_list: List[MinimumThesisData] = []
+        for thesis in thesis_list:
+            minimum_thesis_list.append(parse_thesis_data_to_minimum_data(thesis))
+
+        sweep_id = str(PydanticObjectId())
+        histories: List[ClusterHistory] = []
+        for index, sweep_config in enumerate(sweep_configs):
+            history = new_history(
+                sweep_config,
+                minimum_thesis_list,
+                name=f"New cluster history {index + 1}/{len(sweep_configs)}",
+                sweep_id=sweep_id
+            )
+            await history.save()
+            histories.append(history)
+        # A single job runs the whole sweep, the first history drives it
+        schedule_clustering(str(histories[0].id))
+        return histories
+
+
+    async def get_sweep(
+        self,
+        sweep_id: str,
+    ):
+        histories = await ClusterHistory.find_many(
+            {"sweep_id": sweep_id}
+        ).sort(+ClusterHistory.id).project(SweepClusterHistory).to_list()
+        if not histories:
+            raise NotFoundException("No cluster sweep")
+        return histories
+
 
 
     async def put(
@@ -104,14 +263,28 @@ class ClusterHistoryService:
         self,
         history_id: str,
         status: JobStatusType,
+        whole_job: bool = False,
     ):
-        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)})
+        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)}).project(ClusterHistoryJob)
         if not cluster_history:
             raise NotFoundException("No cluster history")
         update_data = {
             "cluster_job_status.status": status
         }
-        await cluster_history.update({"$set": update_data})
+        query = get_job_query(cluster_history) if whole_job else {'_id': cluster_history.id}
+        await ClusterHistory.find_many(query).update({"$set": update_data})
+
+
+    async def update_timing(
+        self,
+        history_id: str,
+        timing: ClusterHistoryTimingPutRequest,
+    ):
+        query = {'_id': PydanticObjectId(history_id)}
+        cluster_history = await ClusterHistory.find_one(query).project(ClusterHistoryStatus)
+        if not cluster_history:
+            raise NotFoundException("No cluster history")
+        await ClusterHistory.find_one(query).update({"$set": {"timing": timing.dict()}})
 
 
     async def update_result(
@@ -119,97 +292,206 @@ class ClusterHistoryService:
         history_id: str,
         data: ClusterHistoryResultPutRequest,
     ):
-        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)})
+        cluster_history = await ClusterHistory.find_one(
+            {'_id': PydanticObjectId(history_id)}
+        ).project(ClusterHistoryThesisList)
         if not cluster_history:
             raise NotFoundException("No cluster history")
-        
-        update_data = {
-            "loss_values": data.loss_values
-        }
 
-        cluster_list: List[ClusterGroupData] = []
+        list_of_list_ids = []
         for cluster in data.cluster_result:
-            list_ids = []
-            thesis_list: List[int] = []
-            for index in cluster.get("children"):
-                list_ids.append(cluster_history.non_clustered_thesis[index].thesis_id)
-                thesis_list.append(index)
-            suggest_name = (await ThesisDataService().suggest_cluster_name(list_ids))[0]
+            list_of_list_ids.append(
+                [cluster_history.non_clustered_thesis[index].thesis_id for index in cluster.get("children")]
+            )
+        suggestions = await ThesisDataService().suggest_cluster_names(list_of_list_ids)
+
+        cluster_list: List[ClusterGroupData] = []
+        for cluster, suggest_names in zip(data.cluster_result, suggestions):
             parse_cluster = ClusterGroupData(
-                name=suggest_name,
-                children=thesis_list
+                name=suggest_names[0],
+                children=list(cluster.get("children"))
             )
             cluster_list.append(parse_cluster)
-        cluster_history.clusters.append(ClusterPartialResult(result_cluster=cluster_list))
-        update_data["clusters"] = cluster_history.clusters
+        partial_result = ClusterPartialResult(result_cluster=cluster_list, loop=data.loop)
 
-        await cluster_history.update({"$set": update_data})
+        # Each result is appended, the stored history is never rewritten
+        query = {'_id': PydanticObjectId(history_id)}
+        if data.result_index is not None:
+            # A retried or out of order result does not match and is dropped
+            query["clusters"] = {"$size": data.result_index}
+        update_data = {
+            "$push": {
+                "clusters": partial_result.dict(),
+                "loss_values": {"$each": data.loss_values},
+            }
+        }
+        if data.loss_values:
+            update_data["$set"] = {"final_loss": data.loss_values[-1]}
+        update_result = await ClusterHistory.find_one(query).update(update_data)
+        if data.result_index is not None and not update_result.matched_count:
+            # Already stored by a retried request, else the worker is out of step with the history
+            sizes = await ClusterHistory.find_many({'_id': PydanticObjectId(history_id)}).aggregate([
+                {"$project": {"size": {"$size": "$clusters"}}},
+            ]).to_list()
+            stored = sizes[0]["size"] if sizes else 0
+            if stored != data.result_index + 1:
+                raise ConflictException(f"Result {data.result_index} does not follow the {stored} stored results")
 
 
-    async def get_worker_data(
+    async def claim_clustering(
         self,
         history_id: str,
     ):
-        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)})
+        # Moves a ready job to CLUSTERING, whoever notices it first between the nlp results and the worker.
+        # A sweep is claimed through its first history
+        query = {'_id': PydanticObjectId(history_id)}
+        claimed = await ClusterHistory.get_motor_collection().find_one_and_update(
+            dict(query, **ready_job_query),
+            {"$set": {"cluster_job_status.status": JobStatusType.CLUSTERING}},
+            projection={"sweep_id": 1},
+        )
+        if not claimed:
+            cluster_history = await ClusterHistory.find_one(query).project(ClusterHistoryStatus)
+            if not cluster_history:
+                raise NotFoundException("No cluster history")
+            return ClusterJobClaim(
+                claimed=False,
+                waiting_nlp=cluster_history.cluster_job_status.status == JobStatusType.WAITING_NLP
+            )
+
+        n_variants = 1
+        if claimed.get("sweep_id"):
+            sweep_query = {"sweep_id": claimed.get("sweep_id")}
+            await ClusterHistory.find_many(sweep_query).update({"$set": {"cluster_job_status.status": JobStatusType.CLUSTERING}})
+            n_variants = await ClusterHistory.find_many(sweep_query).count()
+        return ClusterJobClaim(claimed=True, waiting_nlp=False, n_variants=n_variants)
+
+
+    async def start_ready_jobs(
+        self,
+        thesis_id: str,
+    ):
+        # Called with every stored nlp result, the jobs it completes start without waiting for the worker
+        histories = await ClusterHistory.find_many(
+            dict({"non_clustered_thesis.thesis_id": thesis_id}, **ready_job_query)
+        ).sort(+ClusterHistory.id).project(ClusterHistoryJob).to_list()
+        job_history_ids = {}
+        for history in histories:
+            job_history_ids.setdefault(history.sweep_id or str(history.id), str(history.id))
+        for history_id in job_history_ids.values():
+            claim = await self.claim_clustering(history_id)
+            if claim.claimed:
+                start_clustering(history_id, claim.n_variants)
+
+
+    async def get_pending_nlp(
+        self,
+        history_id: str,
+    ):
+        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)}).project(ClusterHistoryJobTheses)
         if not cluster_history:
             raise NotFoundException("No cluster history")
-        
+
         minimum_thesis_dict = {str(item.thesis_id): item for item in cluster_history.non_clustered_thesis}
         list_ids = list(minimum_thesis_dict.keys())
 
-        thesis_list = await ThesisDataService().get_list_by_ids(list_ids)
+        thesis_list = await ThesisDataService().get_list_by_ids(list_ids, ThesisMetadata)
         thesis_dict = {str(item.id): item for item in thesis_list}
-        
-        nlp_finish_counter = 0
-        for key, value in thesis_dict.items():
-            if not value.need_nlp_extract:
-                nlp_finish_counter += 1
-            else:
-                if value.nlp_job_id:
-                    res = AsyncResult(value.nlp_job_id)
-                    state = str(res.state)
-                    if state == "FAILURE" or (state == "PENDING" and value.updated_at < datetime.utcnow() - timedelta(minutes=5)):
-                        task_id = schedule_preprocess(value.dict())
-                        await value.update({"$set": {
-                            "nlp_job_id": task_id,
-                            "updated_at": datetime.utcnow()
-                        }})
-                else:
-                    task_id = schedule_preprocess(value.dict())
-                    await value.update({"$set": {
-                            "nlp_job_id": task_id,
-                            "updated_at": datetime.utcnow()
-                        }})
 
-        new_total = len(thesis_list)
-        old_total = len(list_ids)
+        pending_list: List[NlpPendingThesis] = []
+        for key, value in thesis_dict.items():
+            if value.need_nlp_extract:
+                pending_list.append(NlpPendingThesis(id=key, **value.dict(include={
+                    "title", "category", "expected_result", "problem_solve", "nlp_job_id"
+                })))
 
-        update_data = {}    
-        if (old_total > new_total):
+        update_data = {}
+        if len(list_ids) > len(thesis_list):
             new_minimum_list: List[MinimumThesisData] = []
             for id in list_ids:
                 if thesis_dict.get(id):
                     new_minimum_list.append(minimum_thesis_dict.get(id))
             update_data["non_clustered_thesis"] = new_minimum_list
 
+        # From here the counter is kept up to date by the nlp results, see ThesisDataService.update_nlp.
+        # The count read above may already be behind their increments, so it never lowers the counter
+        update_data["cluster_job_status.total_thesis"] = len(thesis_list)
+        update_data["cluster_job_status.status"] = JobStatusType.WAITING_NLP
+        await ClusterHistory.find_many(get_job_query(cluster_history)).update({
+            "$set": update_data,
+            "$max": {"cluster_job_status.total_done_nlp": len(thesis_list) - len(pending_list)},
+        })
+        return pending_list
+
+
+    async def get_worker_data(
+        self,
+        history_id: str,
+    ):
+        cluster_history = await ClusterHistory.find_one({'_id': PydanticObjectId(history_id)}).project(ClusterHistoryJobConfig)
+        if not cluster_history:
+            raise NotFoundException("No cluster history")
+        
+        list_ids = [str(item.thesis_id) for item in cluster_history.non_clustered_thesis]
+        thesis_list = await ThesisDataService().get_list_by_ids(list_ids, ThesisNlpState)
+
+        nlp_finish_counter = 0
+        for value in thesis_list:
+            if not value.need_nlp_extract:
+                nlp_finish_counter += 1
+
+        new_total = len(thesis_list)
         job_status = ClusterJobStatus(
             total_done_nlp=nlp_finish_counter,
             total_thesis=new_total,
-            status=cluster_history.cluster_job_status.status
+            status=JobStatusType.WAITING_NLP
         )
-        ready_for_cluster = False
-        if new_total == nlp_finish_counter:
+        ready_for_cluster = new_total == len(list_ids) and new_total == nlp_finish_counter
+        if ready_for_cluster:
             job_status.status = JobStatusType.CLUSTERING
-            ready_for_cluster = True
-            
-
-        update_data["cluster_job_status"] = job_status
-
-        await cluster_history.update({"$set": update_data})
+        await ClusterHistory.find_many(get_job_query(cluster_history)).update({"$set": {"cluster_job_status": job_status}})
 
         output = cluster_history.dict()
+        output["cluster_job_status"] = job_status
         if ready_for_cluster:
-            output["detail_thesis_dict"] = thesis_dict
+            # The embeddings are only read once every thesis is ready
+            vector_list = await ThesisDataService().get_list_by_ids(list_ids, ThesisVectors)
+            output["detail_thesis_dict"] = {str(item.id): item for item in vector_list}
+            if cluster_history.config.warm_start_history_id:
+                output["initial_labels"] = await self.get_initial_labels(
+                    cluster_history.config.warm_start_history_id, list_ids)
+            if cluster_history.sweep_id:
+                output["sweep_variants"] = await ClusterHistory.find_many(
+                    {"sweep_id": cluster_history.sweep_id}
+                ).sort(+ClusterHistory.id).project(ClusterSweepVariant).to_list()
         output["ready_for_cluster"] = ready_for_cluster
         return WorkerClusterHistory(_id=cluster_history.id,**output)
 
+
+    async def get_initial_labels(
+        self,
+        previous_history_id: str,
+        list_ids: List[str],
+    ):
+        # Cluster of every thesis in the chosen (or else the last) result of a previous history,
+        # -1 for the theses it did not contain. chosen_loop is the index of the chosen result in clusters
+        collection = ClusterHistory.get_motor_collection()
+        query = {'_id': PydanticObjectId(previous_history_id)}
+        previous = await collection.find_one(
+            query, {"chosen_loop": 1, "non_clustered_thesis.thesis_id": 1, "clusters": {"$slice": -1}}
+        )
+        if not previous or not previous.get("clusters"):
+            return None
+        chosen_loop = previous.get("chosen_loop")
+        if chosen_loop is not None and chosen_loop >= 0:
+            chosen = await collection.find_one(query, {"clusters": {"$slice": [chosen_loop, 1]}})
+            if chosen and chosen.get("clusters"):
+                previous["clusters"] = chosen["clusters"]
+
+        previous_ids = [item.get("thesis_id") for item in previous.get("non_clustered_thesis", [])]
+        label_dict = {}
+        for id_cluster, cluster in enumerate(previous["clusters"][0].get("result_cluster", [])):
+            for index in cluster.get("children", []):
+                if index < len(previous_ids):
+                    label_dict[previous_ids[index]] = id_cluster
+        return [label_dict.get(id, -1) for id in list_ids]
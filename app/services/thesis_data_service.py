@@ -1,16 +1,19 @@
 import asyncio
 import io
-from typing import Optional, List
+from typing import Optional, List, Type
 from datetime import datetime
 
+import numpy as np
 import openpyxl
 from fastapi import UploadFile
+from pydantic import BaseModel
 from beanie import PydanticObjectId
 from beanie.operators import RegEx, GTE, Eq, In
 
 from app.helpers.exceptions import NotFoundException, ThesisWrongFormatException
-from app.dto.thesis_data_dto import ShortThesisData, FullThesisData
-from app.models.thesis_data import ThesisData
+from app.dto.thesis_data_dto import ShortThesisData, FullThesisData, ThesisCategory
+from app.models.thesis_data import ThesisData, encode_packed_vector
+from app.models.cluster_history import ClusterHistory, JobStatusType
 from app.worker.tasks.nlp_task import schedule_preprocess
 
 
@@ -70,6 +73,23 @@ def parse_xlsx_thesis(xlsx_file):
         return None
     return input_dict
 
+def get_name_suggestion(categories: List[str]):
+    category_dict = {}
+    for category in categories:
+        list_category = [word.strip().capitalize() for word in category.split(',')]
+        for cate in list_category:
+            if cate in category_dict.keys():
+                category_dict[cate] += 1
+            else:
+                category_dict[cate] = 0
+
+    order = sorted(category_dict, reverse=True)
+    if len(order) > 1:
+        return [order[0], order[1]]
+    elif len(order) == 1:
+        return [order[0]]
+    return ["Default cluster name"]
+
 class ThesisDataService:
     async def list_thesis(
         self,
@@ -134,13 +154,18 @@ class ThesisDataService:
     async def get_list_by_ids(
         self,
         list_ids: List[str],
+        projection_model: Optional[Type[BaseModel]],
     ):
+        # None loads the full documents, embeddings included, so callers have to ask for it
         new_list = []
         for id in list_ids:
             new_list.append(PydanticObjectId(id))
-        thesis_list = await ThesisData.find_many(
+        query_task = ThesisData.find_many(
             In(ThesisData.id, new_list)
-        ).to_list()
+        )
+        if projection_model:
+            query_task = query_task.project(projection_model)
+        thesis_list = await query_task.to_list()
         return thesis_list
     
     async def update_nlp(
@@ -151,33 +176,46 @@ class ThesisDataService:
         expected_result_vector: List,
         problem_solve_vector: List,
     ):
+        # Raw update documents do not go through the bson encoders of ThesisData, the vectors are packed here
         update_data = {
-            "title_vector": title_vector,
-            "category_vector": category_vector,
-            "expected_result_vector": expected_result_vector,
-            "problem_solve_vector": problem_solve_vector,
+            "title_vector": encode_packed_vector(np.asarray(title_vector, dtype=np.float32)),
+            "category_vector": encode_packed_vector(np.asarray(category_vector, dtype=np.float32)),
+            "expected_result_vector": encode_packed_vector(np.asarray(expected_result_vector, dtype=np.float32)),
+            "problem_solve_vector": encode_packed_vector(np.asarray(problem_solve_vector, dtype=np.float32)),
             "updated_at": datetime.utcnow(),
-            "need_nlp_extract": False
+            "need_nlp_extract": False,
+            "nlp_job_id": None
         }
-        await ThesisData.find_one({'_id': PydanticObjectId(thesis_id)}).update({"$set": update_data})
+        result = await ThesisData.find_one(
+            {'_id': PydanticObjectId(thesis_id), 'need_nlp_extract': True}
+        ).update({"$set": update_data})
+        if not result or not result.modified_count:
+            # Re-extraction of a thesis that is already counted as done
+            await ThesisData.find_one({'_id': PydanticObjectId(thesis_id)}).update({"$set": update_data})
+            return
+
+        await ClusterHistory.find_many(
+            {
+                "non_clustered_thesis.thesis_id": thesis_id,
+                "cluster_job_status.status": JobStatusType.WAITING_NLP,
+            }
+        ).update({"$inc": {"cluster_job_status.total_done_nlp": 1}})
 
     async def suggest_cluster_name(
         self,
         list_ids: List[str],
     ):
-        thesis_list = await self.get_list_by_ids(list_ids)
-        category_dict = {}
-        for thesis in thesis_list:
-            list_category = [word.strip().capitalize() for word in thesis.category.split(',')]
-            for cate in list_category:
-                if cate in category_dict.keys():
-                    category_dict[cate] += 1
-                else:
-                    category_dict[cate] = 0
+        return (await self.suggest_cluster_names([list_ids]))[0]
 
-        order = sorted(category_dict, reverse=True)
-        if len(order) > 1:
-            return [order[0], order[1]]
-        elif len(order) == 1:
-            return [order[0]]
-        return ["Default cluster name"]
\ No newline at end of file
+    async def suggest_cluster_names(
+        self,
+        list_of_list_ids: List[List[str]],
+    ):
+        # Categories of every cluster are read in one query
+        all_ids = list({id for list_ids in list_of_list_ids for id in list_ids})
+        thesis_list = await self.get_list_by_ids(all_ids, ThesisCategory)
+        category_dict = {str(thesis.id): thesis.category for thesis in thesis_list}
+        return [
+            get_name_suggestion([category_dict[id] for id in list_ids if id in category_dict])
+            for list_ids in list_of_list_ids
+        ]
@@ -1,6 +1,7 @@
 from celery import Celery
 
 from app.settings.app_settings import AppSettings
+from app.worker.metrics import connect_worker_metrics
 
 app_settings = AppSettings()
 
@@ -17,4 +18,4 @@ celery.conf.task_routes = {
     "app.worker.tasks.nlp_task.*": {"queue": "nlp"},
     "app.worker.tasks.clustering_task.*": {"queue": "clustering"},
 }
-
+connect_worker_metrics(celery)
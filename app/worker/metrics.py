@@ -0,0 +1,93 @@
+import os
+import time
+from typing import List
+
+import redis
+from celery import Celery
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_init, worker_process_shutdown
+from celery.utils.log import get_task_logger
+
+from app.helpers.metrics import celery_task_queue_wait, celery_task_runtime, get_registry, is_multiprocess, \
+    metrics_enabled
+from config.config import settings
+
+logger = get_task_logger(__name__)
+# Port of the metrics exporter of the worker, 0 disables it
+metrics_port = settings.get("METRICS_WORKER_PORT", 9808)
+_task_starts = {}
+
+
+class QueueDepthCollector:
+    # Messages waiting in every queue of the redis broker, read on every scrape
+    def __init__(self, broker_url: str, queues: List[str]) -> None:
+        self.client = redis.Redis.from_url(broker_url)
+        self.queues = queues
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        gauge = GaugeMetricFamily("celery_queue_depth", "Messages waiting in the celery queues", labels=["queue"])
+        for queue in self.queues:
+            try:
+                gauge.add_metric([queue], self.client.llen(queue))
+            except redis.RedisError as error:
+                logger.warning("Cannot read the depth of queue %s: %s" % (queue, error))
+        yield gauge
+
+
+def get_queue(task) -> str:
+    delivery_info = getattr(task.request, "delivery_info", None) or {}
+    return delivery_info.get("routing_key") or "celery"
+
+
+def add_publish_time(headers=None, **kwargs):
+    # Read back by the worker to measure the queue wait
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+def record_task_start(task_id=None, task=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+    published_at = getattr(task.request, "published_at", None)
+    if published_at:
+        celery_task_queue_wait.labels(task.name, get_queue(task)).observe(max(time.time() - published_at, 0))
+
+
+def record_task_end(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is not None:
+        celery_task_runtime.labels(task.name, get_queue(task), state or "UNKNOWN").observe(time.perf_counter() - start)
+
+
+def mark_process_dead(pid=None, **kwargs):
+    if metrics_enabled and is_multiprocess():
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def connect_worker_metrics(celery: Celery):
+    # Publishers (the api and the workers) stamp the tasks, the workers time them and the worker
+    # parent process serves the metrics of its pool children. prometheus-client is only needed by
+    # the exporter, imported once the worker starts
+    def start_exporter(**kwargs):
+        if not metrics_port:
+            return
+        if not metrics_enabled:
+            logger.warning("prometheus-client is not installed, the worker metrics are not served")
+            return
+        from prometheus_client import start_http_server
+
+        registry = get_registry()
+        broker_url = celery.conf.broker_url or ""
+        if broker_url.startswith("redis"):
+            queues = sorted({"celery"} | {route["queue"] for route in (celery.conf.task_routes or {}).values()})
+            registry.register(QueueDepthCollector(broker_url, queues))
+        start_http_server(metrics_port, registry=registry)
+        logger.info("Serving worker metrics on port %s" % metrics_port)
+
+    before_task_publish.connect(add_publish_time, weak=False)
+    task_prerun.connect(record_task_start, weak=False)
+    task_postrun.connect(record_task_end, weak=False)
+    worker_process_shutdown.connect(mark_process_dead, weak=False)
+    worker_init.connect(start_exporter, weak=False)
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+
+class ResultEmitter:
+    # Decides which loop results of a clustering job are sent to the api and sends them from a single
+    # background thread, so the clustering loop never waits for a request. A result is emitted every
+    # emit_every loops, after emit_interval seconds, or when at least emit_label_change of the points
+    # changed cluster since the last emitted result. The last result is always emitted by finish()
+    def __init__(
+        self,
+        send: Callable[[dict], None],
+        n_points: int,
+        emit_every: int = 1,
+        emit_interval: float = 0,
+        emit_label_change: float = 0,
+    ) -> None:
+        self.send = send
+        self.n_points = n_points
+        self.emit_every = max(emit_every, 1)
+        self.emit_interval = emit_interval
+        self.emit_label_change = emit_label_change
+        self.result_index = 0
+        self.sent_loss_count = 0
+        self._loop = 0
+        self._last_loop = 0
+        self._last_time = time.monotonic()
+        self._last_labels = None
+        self._pending = None
+        # Requests not checked yet, every one of them is waited for by finish()
+        self._futures: List[Future] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cluster-result")
+
+    def get_labels(self, result_label: List[List[int]]) -> np.ndarray:
+        labels = np.full(self.n_points, -1, dtype=np.int64)
+        for index, children in enumerate(result_label):
+            labels[list(children)] = index
+        return labels
+
+    def should_emit(self, labels: np.ndarray) -> bool:
+        if self._loop - self._last_loop >= self.emit_every:
+            return True
+        if self.emit_interval and time.monotonic() - self._last_time >= self.emit_interval:
+            return True
+        if self.emit_label_change and self._last_labels is not None and self.n_points:
+            changed = np.count_nonzero(labels != self._last_labels) / self.n_points
+            return changed >= self.emit_label_change
+        return False
+
+    def add(self, result_label: List[List[int]], loss_values: List[float]):
+        self._loop += 1
+        labels = self.get_labels(result_label)
+        if self._last_labels is None or self.should_emit(labels):
+            self._emit(result_label, loss_values, labels)
+        else:
+            self._pending = (result_label, loss_values, labels)
+
+    def finish(self):
+        if self._pending is not None:
+            self._emit(*self._pending)
+        # Surfaces the error of the first failed request
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _emit(self, result_label: List[List[int]], loss_values: List[float], labels: np.ndarray):
+        # A failed request stops the job at the next emission, the requests are sent in order so
+        # every later result would be refused anyway
+        while self._futures and self._futures[0].done():
+            self._futures.pop(0).result()
+
+        result_data = []
+        for index, result in enumerate(result_label):
+            if len(result) == 0:
+                continue
+            result_data.append({
+                "name": f"Cluster {index + 1}",
+                "children": [int(item) for item in result]
+            })
+        payload = {
+            "cluster_result": result_data,
+            "loss_values": [float(value) for value in loss_values[self.sent_loss_count:]],
+            "loop": self._loop,
+            "result_index": self.result_index,
+        }
+        self._futures.append(self._executor.submit(self.send, payload))
+
+        self.result_index += 1
+        self.sent_loss_count = len(loss_values)
+        self._last_loop = self._loop
+        self._last_time = time.monotonic()
+        self._last_labels = labels
+        self._pending = None
@@ -1,17 +1,44 @@
+import threading
 import time
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
+from celery import chord
+from celery.exceptions import SoftTimeLimitExceeded
 from celery.utils.log import get_task_logger
-from httpx import HTTPStatusError
 
 from app.worker.handler import celery
 from app.worker.adapters import backend
-from app.worker.thesis_cluster_class import ThesisClusterObject, ThesisClusterService
+from app.worker.tasks.nlp_task import preprocess_thesis_batch
+from app.worker.result_emitter import ResultEmitter
+from app.worker.thesis_cluster_class import ThesisDataset, ThesisClusterService, get_thesis_matrices
 from app.helpers.cluster.clustering_helper import ClusteringAlgorithm
+from app.helpers.cluster.distance_helper import PairwiseDistanceCache
+from app.helpers.cluster.profiling import PhaseTimer
+from app.helpers.cluster.vectorized_clustering_helper import VectorizedClusteringAlgorithm
+from app.helpers.metrics import clustering_duration, clustering_phase_seconds
+from app.helpers.vector_codec import decode_vector_frame, is_vector_content, vector_content_type
+from config.config import settings
 
 
 logger = get_task_logger(__name__)
 field_weights = [8, 4, 2, 1]
+nlp_thesis_per_task = settings.get("NLP_THESIS_PER_TASK", 16)
+max_nlp_rounds = settings.get("CLUSTER_MAX_NLP_ROUNDS", 3)
+# Delay of the next nlp round when every pending thesis is still queued by its upload task
+nlp_wait_seconds = settings.get("CLUSTER_NLP_WAIT_SECONDS", 30)
+nlp_in_flight_states = {"PENDING", "RECEIVED", "STARTED", "RETRY"}
+# Configs of a sweep run at the same time
+sweep_workers = settings.get("CLUSTER_SWEEP_WORKERS", 1)
+# Seconds given to each config of a job, the time limit of run_clustering grows with the configs of a sweep
+variant_time_limit = settings.get("CLUSTER_VARIANT_TIME_LIMIT", 1200)
+# Lines of the profiler report stored in the timing of a history
+profile_lines = settings.get("CLUSTER_PROFILE_LINES", 40)
+# "binary" asks the api for packed float32 vectors, "json" keeps the plain json payload
+worker_data_headers = {"Accept": vector_content_type} if settings.get("INTERNAL_VECTOR_TRANSPORT", "binary") == "binary" else {}
+clustering_engines = {
+    "reference": ClusteringAlgorithm,
+    "vectorized": VectorizedClusteringAlgorithm,
+}
 
 
 def schedule_clustering(history_id) -> str:
@@ -20,42 +47,186 @@ def schedule_clustering(history_id) -> str:
     return task.id
 
 
+def start_clustering(history_id: str, n_variants: int = 1, nlp_round: int = 0):
+    # Only called by the one that claimed the job, see ClusterHistoryService.claim_clustering
+    # The soft limit fails the configs left, the hard limit only stops a job that ignores it
+    soft_time_limit = variant_time_limit * max(n_variants, 1)
+    run_clustering.apply_async(
+        (history_id, nlp_round),
+        soft_time_limit=soft_time_limit,
+        time_limit=soft_time_limit + 60,
+    )
+
+
 @celery.task(
-    rate_limit="1/m",
-    time_limit=1200,
+    time_limit=120,
 )
-def cluster_thesis(history_id: str):
+def cluster_thesis(history_id: str, nlp_round: int = 0):
+    # Runs the missing nlp extractions as a chord whose callback comes back here. The api starts the
+    # clustering when the last nlp result of the job is stored, the next rounds only catch what it missed
     logger.info(backend.base_url)
     try:
-        update_history_data(history_id=history_id, status="WAITING_NLP")
-        while(True):
-            try:
-                history_data = backend.get(
-                    f"/internal_api/v1/cluster_history/{history_id}/worker_data"
-                )
-                if history_data.status_code == 404:
-                    return
-                history_data.raise_for_status()
+        if nlp_round > 0:
+            claim = claim_clustering(history_id)
+            if claim.get("claimed"):
+                start_clustering(history_id, claim.get("n_variants"), nlp_round)
+                return
+            if not claim.get("waiting_nlp"):
+                # Already started by an nlp result, or ended
+                return
+
+        update_history_data(history_id=history_id, status="WAITING_NLP", whole_job=True)
+        res = backend.get(f"/internal_api/v1/cluster_history/{history_id}/nlp_pending")
+        if res.status_code == 404:
+            return
+        res.raise_for_status()
+        pending_thesis_list = res.json().get("data")
+        if not pending_thesis_list:
+            claim = claim_clustering(history_id)
+            if claim.get("claimed"):
+                start_clustering(history_id, claim.get("n_variants"), nlp_round)
+            return
+        if nlp_round >= max_nlp_rounds:
+            raise Exception("NLP extraction is not finished for %s theses" % len(pending_thesis_list))
+
+        # Theses still queued by their upload task are left to it, its nlp result starts the job
+        extract_list = [thesis for thesis in pending_thesis_list if not is_task_in_flight(thesis.get("nlp_job_id"))]
+        if not extract_list:
+            if nlp_round + 1 < max_nlp_rounds:
+                # Only checks the job again, in case a result was stored without starting it
+                cluster_thesis.apply_async((history_id, nlp_round + 1), countdown=nlp_wait_seconds)
+            logger.info("Waiting upload nlp tasks for %s theses, ref_id: %s" % (len(pending_thesis_list), history_id))
+            return
+
+        header = [
+            preprocess_thesis_batch.s(extract_list[start:start + nlp_thesis_per_task])
+            for start in range(0, len(extract_list), nlp_thesis_per_task)
+        ]
+        # Whether the chord succeeds or not, the next round checks again what is still missing
+        next_round = cluster_thesis.si(history_id, nlp_round + 1)
+        chord(header)(next_round.on_error(cluster_thesis.si(history_id, nlp_round + 1)))
+        logger.info("Waiting nlp for %s theses, %s left to upload tasks, ref_id: %s" % (
+            len(extract_list), len(pending_thesis_list) - len(extract_list), history_id))
+    except Exception as error:
+        logger.exception(error)
+        update_history_data(history_id=history_id, status="FAILED", whole_job=True)
+
+
+@celery.task(
+    soft_time_limit=variant_time_limit,
+    time_limit=variant_time_limit + 60,
+)
+def run_clustering(history_id: str, nlp_round: int = 0):
+    # Histories of the job, every history of the sweep until the data is read
+    variant_ids = None
+    # Histories whose config has finished or failed on its own
+    done_ids = set()
+    cancelled = threading.Event()
+    # Phases shared by every config of the job, added to the timing of each history
+    job_timer = PhaseTimer()
+    job_timer.count("nlp_rounds", nlp_round)
+    try:
+        with job_timer.phase("fetch"):
+            history_data = backend.get(
+                f"/internal_api/v1/cluster_history/{history_id}/worker_data",
+                headers=worker_data_headers
+            )
+            if history_data.status_code == 404:
+                return
+            history_data.raise_for_status()
+            vectors = None
+            if is_vector_content(history_data.headers.get("content-type")):
+                header, vectors = decode_vector_frame(history_data.content)
+                parse_data = header.get("data")
+            else:
                 parse_data = history_data.json().get("data")
-                if parse_data.get("ready_for_cluster"):
-                    break
-                else:
-                    time.sleep(2.0)
-            except HTTPStatusError as error:
-                time.sleep(2.0)
-                continue
+        if not parse_data.get("ready_for_cluster"):
+            # The thesis set changed since the nlp check
+            cluster_thesis.delay(history_id, nlp_round + 1)
+            return
 
         config = parse_data.get("config")
         thesis_list = parse_data.get("non_clustered_thesis")
-        detail_thesis_dict = parse_data.get("detail_thesis_dict")
-        data_set = get_data_sets(thesis_list, detail_thesis_dict)
+        # Every history of a sweep shares the theses and the config apart from the swept parameters
+        variants = parse_data.get("sweep_variants") or [{"_id": history_id, "config": config}]
+        variant_ids = [variant.get("_id") for variant in variants]
+        with job_timer.phase("dataset"):
+            if vectors is not None:
+                data_set = ThesisDataset([vectors[:, field, :] for field in range(vectors.shape[1])])
+            else:
+                data_set = get_data_sets(thesis_list, parse_data.get("detail_thesis_dict"))
+            distance_cache = PairwiseDistanceCache(get_thesis_matrices(data_set))
 
-        service = ThesisClusterService(
-            field_weights=get_field_weights(config.get("order")),
-            field_balance_multipliers=get_field_balance(data_set)
-        )
+        with job_timer.phase("field_balance"):
+            service = ThesisClusterService(
+                field_weights=get_field_weights(config.get("order")),
+                field_balance_multipliers=get_field_balance(distance_cache, config.get("approximate_field_balance", False))
+            )
         logger.info(service.field_balance_multipliers)
-        algo_instance = ClusteringAlgorithm(
+        if len(variants) > 1:
+            # The fuzzifiers of every number of clusters from one pass over the pairwise distances
+            with job_timer.phase("sweep_fuzzifier"):
+                distance_cache.get_delta_arrays(
+                    service.get_field_multipliers(),
+                    [len(data_set) // variant["config"].get("number_of_clusters") for variant in variants]
+                )
+
+        observe_phases(job_timer)
+
+        def run_variant(variant: dict):
+            if cancelled.is_set():
+                return
+            try:
+                run_clustering_variant(
+                    history_id=variant.get("_id"),
+                    config=variant.get("config"),
+                    data_set=data_set,
+                    service=service,
+                    distance_cache=distance_cache,
+                    initial_labels=parse_data.get("initial_labels"),
+                    job_timer=job_timer,
+                    cancelled=cancelled,
+                )
+            finally:
+                done_ids.add(variant.get("_id"))
+
+        if sweep_workers > 1 and len(variants) > 1:
+            with ThreadPoolExecutor(max_workers=min(sweep_workers, len(variants)), thread_name_prefix="sweep") as executor:
+                try:
+                    list(executor.map(run_variant, variants))
+                except SoftTimeLimitExceeded:
+                    # Only this thread gets the time limit, the running configs stop at their next loop
+                    cancelled.set()
+                    raise
+        else:
+            for variant in variants:
+                run_variant(variant)
+    except Exception as error:
+        logger.exception(error)
+        if variant_ids is None:
+            update_history_data(history_id=history_id, status="FAILED", whole_job=True)
+        for failed_id in variant_ids or []:
+            if failed_id not in done_ids:
+                update_history_data(history_id=failed_id, status="FAILED")
+
+
+def run_clustering_variant(
+    history_id: str, config: dict, data_set, service, distance_cache, initial_labels=None, job_timer: PhaseTimer = None,
+    cancelled: threading.Event = None
+):
+    # Runs one config on the shared data, a failed config does not stop the other ones of a sweep
+    timer = PhaseTimer(profiler=config.get("profiler"), profile_lines=profile_lines)
+    if job_timer is not None:
+        timer.merge(job_timer)
+    engine = config.get("engine") or "vectorized"
+    start = time.perf_counter()
+    try:
+        timer.start_profile()
+        algorithm_class = clustering_engines.get(engine, VectorizedClusteringAlgorithm)
+        engine_options = {}
+        if issubclass(algorithm_class, VectorizedClusteringAlgorithm):
+            engine_options["distance_cache"] = distance_cache
+        algo_instance = algorithm_class(
             dataset=data_set,
             model=service,
             n_clusters=config.get("number_of_clusters"),
@@ -63,45 +234,95 @@ def cluster_thesis(history_id: str):
             upper_m=config.get("upper_m"),
             lower_m=config.get("lower_m"),
             alpha=config.get("alpha"),
-            n_loop=config.get("max_loop")
+            n_loop=config.get("max_loop"),
+            loss_tolerance=config.get("loss_tolerance", 0),
+            loss_window=config.get("loss_window", 3),
+            initial_labels=initial_labels,
+            init_method=config.get("init_method") or "kmeans++",
+            random_state=config.get("random_state"),
+            assignment=config.get("assignment", "sequential"),
+            timer=timer,
+            **engine_options
         )
 
-        # Cluster loop
-        for result_label, loss_values in algo_instance.clustering():
-            result_data = []
-            for index, result in enumerate(result_label):
-                if len(result) == 0:
-                    continue
-                children = []
-                for item in result:
-                    children.append(item)
-                new_cluster = {
-                    "name": f"Cluster {index + 1}",
-                    "children": children
-                }
-                result_data.append(new_cluster)
-
-            res = backend.put(
-                f"/internal_api/v1/cluster_history/{history_id}/cluster_result",
-                json={
-                    "cluster_result": result_data,
-                    "loss_values": loss_values
-                }
-            )
-            res.raise_for_status()
+        # Cluster loop, results are sent in the background according to the emission policy of the job
+        emitter = ResultEmitter(
+            send=lambda payload: put_cluster_result(history_id, payload),
+            n_points=len(data_set),
+            emit_every=config.get("emit_every", 1),
+            emit_interval=config.get("emit_interval", 0),
+            emit_label_change=config.get("emit_label_change", 0),
+        )
+        try:
+            for result_label, loss_values in algo_instance.clustering():
+                if cancelled is not None and cancelled.is_set():
+                    raise SoftTimeLimitExceeded()
+                emitter.add(result_label, loss_values)
+            with timer.phase("emit_wait"):
+                emitter.finish()
+        finally:
+            emitter.close()
+            timer.stop_profile()
 
+        clustering_duration.labels(engine, "FINISHED").observe(time.perf_counter() - start)
+        observe_phases(timer, exclude=job_timer)
+        put_cluster_timing(history_id, timer.get_summary())
         update_history_data(history_id=history_id, status="FINISHED")
-        logger.info("Finish cluster, ref_id: %s" % history_id)
+        logger.info("Finish cluster, ref_id: %s, phases: %s" % (history_id, dict(timer.seconds)))
     except Exception as error:
+        clustering_duration.labels(engine, "FAILED").observe(time.perf_counter() - start)
         logger.exception(error)
         update_history_data(history_id=history_id, status="FAILED")
+        if isinstance(error, SoftTimeLimitExceeded):
+            raise
+
 
+def observe_phases(timer: PhaseTimer, exclude: PhaseTimer = None):
+    # Phases merged from the job timer were already counted once for the whole job
+    for phase, seconds in timer.seconds.items():
+        if exclude is None or phase not in exclude.seconds:
+            clustering_phase_seconds.labels(phase).inc(seconds)
 
-def update_history_data(history_id: str, status: str):
+
+def is_task_in_flight(task_id: str) -> bool:
+    # Celery also reports unknown or expired tasks as PENDING, the rounds limit how long they are awaited
+    return bool(task_id) and celery.AsyncResult(task_id).state in nlp_in_flight_states
+
+
+def claim_clustering(history_id: str) -> dict:
+    # Answered from the nlp counter of the history, no thesis document is loaded
+    res = backend.put(f"/internal_api/v1/cluster_history/{history_id}/clustering_claim")
+    res.raise_for_status()
+    return res.json().get("data")
+
+
+def put_cluster_result(history_id: str, payload: dict):
+    res = backend.put(
+        f"/internal_api/v1/cluster_history/{history_id}/cluster_result",
+        json=payload
+    )
+    res.raise_for_status()
+
+
+def put_cluster_timing(history_id: str, timing: dict):
+    # The timing is only a report, a failed request does not fail the job
+    try:
+        res = backend.put(
+            f"/internal_api/v1/cluster_history/{history_id}/timing",
+            json=timing
+        )
+        res.raise_for_status()
+    except Exception as error:
+        logger.warning("Cannot store the timing of %s: %s" % (history_id, error))
+
+
+def update_history_data(history_id: str, status: str, whole_job: bool = False):
+    # whole_job sets the status of every history of the sweep of the history
     backend.put(
         f"/internal_api/v1/cluster_history/{history_id}/status",
         json={
-            "status": status
+            "status": status,
+            "whole_job": whole_job
         }
     )
 
@@ -111,48 +332,18 @@ def get_field_weights(input: list):
         result.append(field_weights[i])
     return result
 
-def get_field_balance(input: list):
-    title_balance = 1
-    category_balance = 1
-    expected_balance = 1
-    problem_balance = 1
-
-    N = len(input)
-    max_title = 0
-    max_category = 0
-    max_expected = 0
-    max_problem = 0
-    for i in range(N):
-        object_i = input[i]
-        for j in range(N):
-            if i == j:
-                continue
-            object_j = input[j]
-            max_title = max(np.linalg.norm(np.array(object_i.title_vector) - np.array(object_j.title_vector)), max_title)
-            max_category = max(np.linalg.norm(np.array(object_i.category_vector) - np.array(object_j.category_vector)), max_category)
-            max_expected = max(np.linalg.norm(np.array(object_i.expected_result_vector) - np.array(object_j.expected_result_vector)), max_expected)
-            max_problem = max(np.linalg.norm(np.array(object_i.problem_solve_vector) - np.array(object_j.problem_solve_vector)), max_problem)
-
-    if max_title > 0:
-        title_balance = 1 / max_title
-    if max_category > 0:
-        category_balance = 1 / max_category
-    if max_expected > 0:
-        expected_balance = 1 / max_expected
-    if max_problem > 0:
-        problem_balance = 1 / max_problem
-    return [title_balance, category_balance, expected_balance, problem_balance]
+def get_field_balance(distance_cache: PairwiseDistanceCache, approximate: bool = False):
+    if approximate:
+        max_distances, upper_bounds = distance_cache.get_approximate_max_field_distances()
+        logger.info("Approximate max field distances %s, upper bounds %s" % (max_distances, upper_bounds))
+    else:
+        max_distances = distance_cache.get_max_field_distances()
 
-def get_data_sets(input_list: list, input_dict: dict):
     result = []
-    for item in input_list:
-        thesis_id = item.get("thesis_id")
-        related_thesis = input_dict.get(thesis_id)
-        data = ThesisClusterObject(
-            title_vector=related_thesis.get("title_vector"),
-            category_vector=related_thesis.get("category_vector"),
-            expected_result_vector=related_thesis.get("expected_result_vector"),
-            problem_solve_vector=related_thesis.get("problem_solve_vector")
-        )
-        result.append(data)
-    return result
\ No newline at end of file
+    for max_distance in max_distances:
+        result.append(1 / max_distance if max_distance > 0 else 1)
+    return result
+
+def get_data_sets(input_list: list, input_dict: dict):
+    related_thesis_list = [input_dict.get(item.get("thesis_id")) for item in input_list]
+    return ThesisDataset.from_vectors(related_thesis_list)
\ No newline at end of file
@@ -1,48 +1,77 @@
-from typing import Dict
+import os
+from typing import Dict, List
 
+import torch
+from celery.signals import worker_init, worker_process_init
 from celery.utils.log import get_task_logger
 from celery.exceptions import TimeLimitExceeded
 from httpx import HTTPStatusError
 
-from app.helpers.nlp_preload import NLP
+from app.helpers.nlp_preload import get_nlp_service, preload_for_fork, nlp_service
+from app.helpers.vector_codec import encode_vector_frame, vector_content_type
 from app.worker.handler import celery
 from app.worker.adapters import backend
+from config.config import settings
 
 logger = get_task_logger(__name__)
+thesis_text_fields = ["title", "category", "expected_result", "problem_solve"]
+# "parent": load in the main worker process and share it with the forked pool children,
+# "process": load in every pool child at boot, "lazy": load on the first nlp task
+nlp_preload_mode = settings.get("NLP_PRELOAD_MODE", "parent")
+nlp_torch_threads = settings.get("NLP_TORCH_THREADS", 1)
+vector_transport = settings.get("INTERNAL_VECTOR_TRANSPORT", "binary")
 
 
-def schedule_preprocess(thesis: Dict) -> str:
-    thesis_dict = {
+@worker_init.connect
+def preload_nlp_model_in_parent(**kwargs):
+    if nlp_preload_mode == "parent":
+        preload_for_fork()
+        logger.info("Loaded nlp model in worker parent process %s" % os.getpid())
+
+
+@worker_process_init.connect
+def preload_nlp_model_in_child(**kwargs):
+    # Keep the pool children from oversubscribing the cores with torch intra-op threads
+    torch.set_num_threads(nlp_torch_threads)
+    if nlp_preload_mode == "process":
+        get_nlp_service()
+        logger.info("Loaded nlp model in worker process %s" % os.getpid())
+
+
+def get_preprocess_input(thesis: Dict) -> Dict:
+    return {
         "title": thesis.get("title"),
         "category": thesis.get("category"),
         "expected_result": thesis.get("expected_result"),
         "problem_solve": thesis.get("problem_solve"),
         "id": str(thesis.get("id"))
     }
-    task = preprocess_thesis.delay(thesis_dict)
+
+
+def schedule_preprocess(thesis: Dict) -> str:
+    task = preprocess_thesis.delay(get_preprocess_input(thesis))
     logger.info("Created a celery task id=%s" % task.id)
     return task.id
 
 
-@celery.task(
-    rate_limit="10/m",
-    time_limit=120
-)
-def preprocess_thesis(thesis: Dict):
+def schedule_preprocess_batch(theses: List[Dict]) -> str:
+    task = preprocess_thesis_batch.delay([get_preprocess_input(thesis) for thesis in theses])
+    logger.info("Created a celery batch task id=%s for %s theses" % (task.id, len(theses)))
+    return task.id
+
+
+def update_thesis_features(thesis: Dict, output_features: List):
     try:
-        input_line = [
-            thesis.get("title", ""),
-            thesis.get("category", ""),
-            thesis.get("expected_result", ""),
-            thesis.get("problem_solve", "")
-        ]
-        nlp_service = NLP()
-        nlp_service.initialize()
-        output_features = nlp_service.extract_feature(input_line)
-        try:
-            thesis_id = thesis.get('_id')
-            if not thesis_id:
-                thesis_id = thesis.get('id')
+        thesis_id = thesis.get('_id')
+        if not thesis_id:
+            thesis_id = thesis.get('id')
+        if vector_transport == "binary":
+            res = backend.put(
+                f"/internal_api/v1/thesis_data/{thesis_id}/update_nlp",
+                content=encode_vector_frame({}, output_features),
+                headers={"Content-Type": vector_content_type},
+            )
+        else:
             res = backend.put(
                 f"/internal_api/v1/thesis_data/{thesis_id}/update_nlp",
                 json={
@@ -52,12 +81,59 @@ def preprocess_thesis(thesis: Dict):
                     "problem_solve_vector": output_features[3]
                 },
             )
-            res.raise_for_status()
-            logger.info("Processed: %s" % thesis.get("title"))
-            return res.json()
-        except HTTPStatusError as error:
-            return error.response.json()
+        res.raise_for_status()
+        logger.info("Processed: %s" % thesis.get("title"))
+        return res.json()
+    except HTTPStatusError as error:
+        return error.response.json()
+
+
+@celery.task(
+    rate_limit="10/m",
+    time_limit=120
+)
+def preprocess_thesis(thesis: Dict):
+    try:
+        input_line = [thesis.get(field, "") for field in thesis_text_fields]
+        output_features = get_nlp_service().extract_feature(input_line)
+        logger.info("Embedding cache: %s" % nlp_service.embedding_cache.stats())
+        return update_thesis_features(thesis, output_features)
     except TimeLimitExceeded:
         return
     except Exception as ex:
-        logger.exception(ex)
\ No newline at end of file
+        # A failed upload task is not awaited by the clustering jobs, see is_task_in_flight
+        logger.exception(ex)
+        raise
+
+
+@celery.task(
+    time_limit=600
+)
+def preprocess_thesis_batch(theses: List[Dict]):
+    # Every field of every thesis goes through the model in shared forward passes
+    try:
+        input_line = [thesis.get(field, "") for thesis in theses for field in thesis_text_fields]
+        output_features = get_nlp_service().extract_feature_batch(input_line)
+        logger.info("Embedding cache: %s" % nlp_service.embedding_cache.stats())
+        n_fields = len(thesis_text_fields)
+        results = []
+        for index, thesis in enumerate(theses):
+            thesis_features = output_features[index * n_fields:(index + 1) * n_fields]
+            results.append(update_thesis_features(thesis, thesis_features))
+        return results
+    except TimeLimitExceeded:
+        return
+    except Exception as ex:
+        # Fails the chord header, so the clustering job goes through its error path
+        logger.exception(ex)
+        raise
+
+
+@celery.task
+def check_nlp_ready():
+    return {
+        "ready": nlp_service.is_ready,
+        "preload_mode": nlp_preload_mode,
+        "pid": os.getpid(),
+        "embedding_cache": nlp_service.embedding_cache.stats() if nlp_service.embedding_cache else None,
+    }
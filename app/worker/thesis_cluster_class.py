@@ -1,28 +1,46 @@
-from typing import List
+from typing import List, Union
 import numpy as np
 from app.helpers.cluster.base_cluster import ClusterObject, ClusterService
 
+thesis_fields = ["title_vector", "category_vector", "expected_result_vector", "problem_solve_vector"]
+
 
 class ThesisClusterObject(ClusterObject):
-    title_vector: list
-    category_vector: list
-    expected_result_vector: list
-    problem_solve_vector: list
+    __slots__ = tuple(thesis_fields)
+
+    def __init__(self, title_vector, category_vector, expected_result_vector, problem_solve_vector):
+        self.title_vector = np.asarray(title_vector, dtype=np.float32)
+        self.category_vector = np.asarray(category_vector, dtype=np.float32)
+        self.expected_result_vector = np.asarray(expected_result_vector, dtype=np.float32)
+        self.problem_solve_vector = np.asarray(problem_solve_vector, dtype=np.float32)
+
+
+class ThesisDataset:
+    # Contiguous float32 N x D matrix per field, items are views on the matrix rows
+    __slots__ = ("matrices",)
+
+    def __init__(self, matrices: List[np.ndarray]):
+        self.matrices = [np.ascontiguousarray(matrix, dtype=np.float32) for matrix in matrices]
+
+    @classmethod
+    def from_vectors(cls, items: List[dict]):
+        return cls([np.array([item.get(field) for item in items], dtype=np.float32) for field in thesis_fields])
 
-def multiply_array(input: list, multiplier: float):
-    result = []
-    for item in input:
-        result.append(item * multiplier)
-    return result
+    def __len__(self):
+        return self.matrices[0].shape[0]
 
-def get_medium_array(input: list, total_uik: float):
-    result = np.zeros_like(input[0])
+    def __getitem__(self, index: int) -> ThesisClusterObject:
+        return ThesisClusterObject(*[matrix[index] for matrix in self.matrices])
 
-    for item in input:
-        result += np.array(item)
-    
-    result /= total_uik
-    return result.tolist()
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def get_thesis_matrices(data: Union[ThesisDataset, List[ThesisClusterObject]]) -> List[np.ndarray]:
+    if isinstance(data, ThesisDataset):
+        return data.matrices
+    return [np.array([getattr(item, field) for item in data], dtype=np.float32) for field in thesis_fields]
 
 
 class ThesisClusterService(ClusterService):
@@ -31,23 +49,20 @@ class ThesisClusterService(ClusterService):
         self.field_balance_multipliers = field_balance_multipliers
 
     def get_distance_between_two_object(self, first_object: ThesisClusterObject, second_object: ThesisClusterObject) -> float:
-        dis1 = np.linalg.norm(np.array(first_object.title_vector) - np.array(second_object.title_vector)) * self.field_weights[0] * self.field_balance_multipliers[0]
-        dis2 = np.linalg.norm(np.array(first_object.category_vector) - np.array(second_object.category_vector)) * self.field_weights[1] * self.field_balance_multipliers[1]
-        dis3 = np.linalg.norm(np.array(first_object.expected_result_vector) - np.array(second_object.expected_result_vector)) * self.field_weights[2] * self.field_balance_multipliers[2]
-        dis4 = np.linalg.norm(np.array(first_object.problem_solve_vector) - np.array(second_object.problem_solve_vector)) * self.field_weights[3] * self.field_balance_multipliers[3]
-        return dis1 + dis2 + dis3 + dis4
-    
-    def calculate_centroid_from_list_and_uik(self, uik_pow: list, data: List[ThesisClusterObject]) -> ThesisClusterObject:
-        list_title = [multiply_array(item.title_vector, uik) for uik, item in zip(uik_pow, data)]
-        list_category = [multiply_array(item.category_vector, uik) for uik, item in zip(uik_pow, data)]
-        list_expected = [multiply_array(item.expected_result_vector, uik) for uik, item in zip(uik_pow, data)]
-        list_problem = [multiply_array(item.problem_solve_vector, uik) for uik, item in zip(uik_pow, data)]
-        
-        total_uik = sum(uik_pow)
-        new_centroid = ThesisClusterObject(
-            title_vector=get_medium_array(list_title, total_uik),
-            category_vector=get_medium_array(list_category, total_uik),
-            expected_result_vector=get_medium_array(list_expected, total_uik),
-            problem_solve_vector=get_medium_array(list_problem, total_uik)
-        )
-        return new_centroid
\ No newline at end of file
+        dis1 = np.linalg.norm(first_object.title_vector - second_object.title_vector) * self.field_weights[0] * self.field_balance_multipliers[0]
+        dis2 = np.linalg.norm(first_object.category_vector - second_object.category_vector) * self.field_weights[1] * self.field_balance_multipliers[1]
+        dis3 = np.linalg.norm(first_object.expected_result_vector - second_object.expected_result_vector) * self.field_weights[2] * self.field_balance_multipliers[2]
+        dis4 = np.linalg.norm(first_object.problem_solve_vector - second_object.problem_solve_vector) * self.field_weights[3] * self.field_balance_multipliers[3]
+        return float(dis1 + dis2 + dis3 + dis4)
+
+    def get_data_matrices(self, data: Union[ThesisDataset, List[ThesisClusterObject]]) -> List[np.ndarray]:
+        return get_thesis_matrices(data)
+
+    def get_field_multipliers(self) -> List[float]:
+        return [weight * balance for weight, balance in zip(self.field_weights, self.field_balance_multipliers)]
+
+    def calculate_centroid_from_list_and_uik(self, uik_pow: list, data: Union[ThesisDataset, List[ThesisClusterObject]]) -> ThesisClusterObject:
+        # One weighted matrix-vector product per field, weights are normalized in float64 first
+        uik_pow = np.asarray(uik_pow, dtype=np.float64)
+        weights = (uik_pow / uik_pow.sum()).astype(np.float32)
+        return ThesisClusterObject(*[weights @ matrix for matrix in get_thesis_matrices(data)])
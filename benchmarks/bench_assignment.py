@@ -0,0 +1,49 @@
+import argparse
+import time
+
+import numpy as np
+
+from app.helpers.cluster.assignment import get_assignment
+
+# Time and quality of the capacity constrained assignment methods on random membership matrices
+# python -m benchmarks.bench_assignment --points 1000 10000 100000 --clusters 50
+
+
+def make_membership(n_points: int, n_clusters: int, sharpness: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    membership = np.exp(rng.normal(size=(n_points, n_clusters)) * sharpness)
+    return membership / membership.sum(axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--slack", type=int, default=2, help="extra room of every cluster over points / clusters")
+    parser.add_argument("--sharpness", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--methods", nargs="+", default=["sequential", "global_greedy", "auction"])
+    parser.add_argument("--auction-max-points", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'points':>8}  {'method':<14}{'seconds':>10}{'total membership':>18}{'top choice':>12}")
+    for n_points in args.points:
+        membership = make_membership(n_points, args.clusters, args.sharpness, args.seed)
+        max_size_cluster = -(-n_points // args.clusters) + args.slack
+        top_choice = membership.argmax(axis=1)
+        for method in args.methods:
+            if method == "auction" and n_points > args.auction_max_points:
+                continue
+            start = time.perf_counter()
+            labels = get_assignment(method, membership, max_size_cluster)
+            elapsed = time.perf_counter() - start
+            assigned = labels >= 0
+            total = membership[np.flatnonzero(assigned), labels[assigned]].sum()
+            print(
+                f"{n_points:>8}  {method:<14}{elapsed:>10.3f}{total:>18.2f}"
+                f"{np.mean(labels == top_choice):>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.helpers.cluster.vectorized_clustering_helper import VectorizedClusteringAlgorithm
+from benchmarks.synthetic import make_problem
+
+# Loops until convergence and final loss of every centroid initialization method
+# python -m benchmarks.bench_initialization --points 1000 --clusters 20
+
+
+def run(dataset, service, distance_cache, args, init_method, seed):
+    random.seed(seed)
+    algorithm = VectorizedClusteringAlgorithm(
+        dataset=dataset,
+        model=service,
+        n_clusters=args.clusters,
+        max_size_cluster=args.max_size or -(-len(dataset) // args.clusters) + 2,
+        upper_m=args.upper_m,
+        lower_m=args.lower_m,
+        n_loop=args.max_loop,
+        init_method=init_method,
+        random_state=seed,
+        distance_cache=distance_cache,
+    )
+    start = time.perf_counter()
+    loops = 0
+    for _, loss_values in algorithm.clustering():
+        loops += 1
+    return loops, loss_values[-1], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=1000)
+    parser.add_argument("--clusters", type=int, default=20)
+    parser.add_argument("--groups", type=int, default=None)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--spread", type=float, default=3.0)
+    parser.add_argument("--grouped-order", action="store_true")
+    parser.add_argument("--max-size", type=int, default=None)
+    parser.add_argument("--max-loop", type=int, default=50)
+    parser.add_argument("--upper-m", type=float, default=1.1)
+    parser.add_argument("--lower-m", type=float, default=9.1)
+    parser.add_argument("--seeds", type=int, default=5)
+    parser.add_argument("--methods", nargs="+", default=["legacy", "kmeans++", "farthest_first", "sample_refine"])
+    args = parser.parse_args()
+
+    dataset, service, distance_cache = make_problem(
+        args.points, args.groups or args.clusters, args.dimension, args.spread, grouped_order=args.grouped_order)
+    distance_cache.get_delta_array(service.get_field_multipliers(), args.points // args.clusters)
+
+    print(f"{'method':<16}{'loops':>8}{'max loops':>11}{'final loss':>14}{'seconds':>10}")
+    for method in args.methods:
+        results = np.array([run(dataset, service, distance_cache, args, method, seed) for seed in range(args.seeds)])
+        print(
+            f"{method:<16}{results[:, 0].mean():>8.1f}{int(results[:, 0].max()):>11}"
+            f"{results[:, 1].mean():>14.4f}{results[:, 2].mean():>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from app.helpers.cluster.clustering_helper import ClusteringAlgorithm
+from app.helpers.cluster.distance_helper import PairwiseDistanceCache
+from app.helpers.cluster.vectorized_clustering_helper import VectorizedClusteringAlgorithm
+from app.worker.thesis_cluster_class import ThesisClusterService
+from benchmarks.synthetic import field_weights, make_dataset
+
+# Time and memory peak of every phase of the clustering pipeline on synthetic thesis embeddings, without
+# mongo, redis or the nlp model. Per iteration phases are reported per call. Results can be stored as a
+# baseline and later runs compared with it to catch regressions in the hot path
+# python -m benchmarks.bench_pipeline --points 100 1000 5000 --clusters 10 50
+# python -m benchmarks.bench_pipeline --save-baseline
+# python -m benchmarks.bench_pipeline --check
+
+default_baseline_path = os.path.join(os.path.dirname(__file__), "baselines", "pipeline.json")
+engines = {
+    "reference": ClusteringAlgorithm,
+    "vectorized": VectorizedClusteringAlgorithm,
+}
+# Engine methods timed as a phase of the clustering loop
+engine_phases = {
+    "_generate_centroid": "init",
+    "_generate_centroid_from_labels": "init",
+    "_get_initial_members": "init",
+    "_generate_centroid_from_members": "init",
+    "_update_membership": "membership",
+    "_update_centroid": "centroid",
+    "_calculate_loss_function": "loss",
+    "_assign_labels": "assignment",
+}
+phase_order = ["distance_cache", "field_balance", "fuzzifier", "init", "membership", "centroid", "loss", "assignment"]
+megabyte = 1024 * 1024
+
+
+class PhaseRecorder:
+    # Total seconds, calls and memory peak above the memory in use at the start of every phase.
+    # Phases must not be nested, the tracemalloc peak is reset when a phase starts
+    def __init__(self, trace_memory: bool = True) -> None:
+        self.trace_memory = trace_memory
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.peaks = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.trace_memory:
+            start_memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+            if self.trace_memory:
+                self.peaks[name] = max(self.peaks[name], tracemalloc.get_traced_memory()[1] - start_memory)
+
+    def get_result(self) -> dict:
+        return {
+            name: {
+                "calls": self.calls[name],
+                "seconds": self.seconds[name],
+                "seconds_per_call": self.seconds[name] / self.calls[name],
+                "peak_bytes": self.peaks[name],
+            }
+            for name in phase_order if self.calls[name]
+        }
+
+
+def timed_engine(engine_class, recorder: PhaseRecorder):
+    def wrap(method, phase):
+        def timed(self, *args, **kwargs):
+            with recorder.phase(phase):
+                return method(self, *args, **kwargs)
+        return timed
+
+    methods = {
+        name: wrap(getattr(engine_class, name), phase)
+        for name, phase in engine_phases.items() if hasattr(engine_class, name)
+    }
+    return type(f"Timed{engine_class.__name__}", (engine_class,), methods)
+
+
+def run_case(dataset, engine: str, n_clusters: int, args) -> dict:
+    recorder = PhaseRecorder(trace_memory=not args.no_memory)
+    random.seed(args.seed)
+    with recorder.phase("distance_cache"):
+        distance_cache = PairwiseDistanceCache(dataset.matrices)
+    with recorder.phase("field_balance"):
+        if args.approximate_field_balance:
+            max_distances, _ = distance_cache.get_approximate_max_field_distances()
+        else:
+            max_distances = distance_cache.get_max_field_distances()
+        service = ThesisClusterService(
+            field_weights=field_weights,
+            field_balance_multipliers=[1 / value if value > 0 else 1 for value in max_distances],
+        )
+
+    engine_class = engines[engine]
+    engine_options = {}
+    if issubclass(engine_class, VectorizedClusteringAlgorithm):
+        engine_options["distance_cache"] = distance_cache
+    with recorder.phase("fuzzifier"):
+        algorithm = timed_engine(engine_class, recorder)(
+            dataset=dataset,
+            model=service,
+            n_clusters=n_clusters,
+            max_size_cluster=-(-len(dataset) // n_clusters) + 2,
+            upper_m=args.upper_m,
+            lower_m=args.lower_m,
+            n_loop=args.max_loop,
+            init_method=args.init_method,
+            random_state=args.seed,
+            assignment=args.assignment,
+            **engine_options
+        )
+
+    loops = 0
+    loss = None
+    start = time.perf_counter()
+    for _, loss_values in algorithm.clustering():
+        loops += 1
+        loss = loss_values[-1] if loss_values else None
+    return {
+        "loops": loops,
+        "final_loss": loss,
+        "loop_seconds": time.perf_counter() - start,
+        "phases": recorder.get_result(),
+    }
+
+
+def get_case_name(engine: str, n_points: int, n_clusters: int, dimension: int) -> str:
+    return f"{engine}_n{n_points}_k{n_clusters}_d{dimension}"
+
+
+def merge_repeats(results: list) -> dict:
+    # Fastest time and largest memory peak of every phase over the repeats
+    merged = dict(results[0], phases={})
+    for name in results[0]["phases"]:
+        phases = [result["phases"][name] for result in results if name in result["phases"]]
+        merged["phases"][name] = dict(
+            phases[0],
+            seconds=min(phase["seconds"] for phase in phases),
+            seconds_per_call=min(phase["seconds_per_call"] for phase in phases),
+            peak_bytes=max(phase["peak_bytes"] for phase in phases),
+        )
+    merged["loop_seconds"] = min(result["loop_seconds"] for result in results)
+    return merged
+
+
+def print_case(name: str, result: dict):
+    print(f"\n{name}: {result['loops']} loops, final loss {result['final_loss']:.6f}")
+    print(f"  {'phase':<16}{'calls':>7}{'total s':>10}{'ms / call':>12}{'peak MB':>10}")
+    for phase, values in result["phases"].items():
+        print(
+            f"  {phase:<16}{values['calls']:>7}{values['seconds']:>10.3f}"
+            f"{values['seconds_per_call'] * 1000:>12.2f}{values['peak_bytes'] / megabyte:>10.1f}"
+        )
+
+
+def compare_with_baseline(cases: dict, baseline: dict, args) -> list:
+    regressions = []
+    for name, result in cases.items():
+        baseline_case = baseline.get("cases", {}).get(name)
+        if baseline_case is None:
+            print(f"{name}: no baseline")
+            continue
+        for phase, values in result["phases"].items():
+            baseline_values = baseline_case["phases"].get(phase)
+            if baseline_values is None:
+                continue
+            seconds, baseline_seconds = values["seconds_per_call"], baseline_values["seconds_per_call"]
+            if seconds > baseline_seconds * args.tolerance and seconds - baseline_seconds > args.min_seconds:
+                regressions.append(
+                    f"{name} {phase}: {seconds * 1000:.2f} ms per call, baseline {baseline_seconds * 1000:.2f} ms")
+            peak, baseline_peak = values["peak_bytes"], baseline_values["peak_bytes"]
+            if (
+                not args.no_memory and baseline_peak
+                and peak > baseline_peak * args.memory_tolerance and peak - baseline_peak > megabyte
+            ):
+                regressions.append(
+                    f"{name} {phase}: {peak / megabyte:.1f} MB peak, baseline {baseline_peak / megabyte:.1f} MB")
+    return regressions
+
+
+def get_machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--groups", type=int, default=None, help="gaussian groups of the dataset, the number of clusters when unset")
+    parser.add_argument("--engines", nargs="+", default=["vectorized"], choices=list(engines.keys()))
+    parser.add_argument("--reference-max-points", type=int, default=500)
+    parser.add_argument("--max-loop", type=int, default=10)
+    parser.add_argument("--upper-m", type=float, default=1.1)
+    parser.add_argument("--lower-m", type=float, default=9.1)
+    parser.add_argument("--init-method", default="legacy")
+    parser.add_argument("--assignment", default="sequential")
+    parser.add_argument("--approximate-field-balance", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs of every case, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="do not trace the memory peaks")
+    parser.add_argument("--baseline", default=default_baseline_path)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results of the cases in the baseline")
+    parser.add_argument("--check", action="store_true", help="compare with the baseline, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="allowed slowdown ratio per phase")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="slowdowns below this are noise")
+    parser.add_argument("--memory-tolerance", type=float, default=1.2, help="allowed memory peak ratio per phase")
+    args = parser.parse_args()
+
+    if not args.no_memory:
+        tracemalloc.start()
+    print(f"{get_machine()}")
+    cases = {}
+    for n_points in args.points:
+        for n_clusters in args.clusters:
+            if n_clusters >= n_points:
+                continue
+            dataset = make_dataset(n_points, args.groups or n_clusters, args.dimension, seed=args.seed)
+            for engine in args.engines:
+                if engine == "reference" and n_points > args.reference_max_points:
+                    continue
+                name = get_case_name(engine, n_points, n_clusters, args.dimension)
+                cases[name] = merge_repeats([run_case(dataset, engine, n_clusters, args) for _ in range(args.repeat)])
+                print_case(name, cases[name])
+            del dataset
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}")
+            sys.exit(1)
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("machine") != get_machine():
+            print(f"\nBaseline recorded on another machine: {baseline.get('machine')}")
+        regressions = compare_with_baseline(cases, baseline, args)
+        print("\n" + ("\n".join(regressions) if regressions else "No regression against the baseline"))
+        if regressions:
+            sys.exit(1)
+
+    if args.save_baseline:
+        baseline = {"cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline["machine"] = get_machine()
+        baseline["cases"].update(cases)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f"\nSaved {len(cases)} cases to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
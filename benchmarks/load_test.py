@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+import numpy as np
+from beanie import init_beanie
+from bson import ObjectId
+from motor import motor_asyncio
+
+from app import database
+from app.helpers.auth_helpers import get_current_user
+from app.helpers.vector_codec import vector_content_type
+from app.models.cluster_history import ClusterConfig, ClusterHistory
+from app.models.thesis_data import ThesisData, encode_packed_vector, vector_fields
+from app.services import cluster_history_service, thesis_data_service
+from main import app
+
+# Latency and throughput of the api routes under concurrency, in process: the requests go through the
+# asgi app with httpx, mongo is mongomock-motor (or a real server with --mongo-dsn), celery is replaced
+# by fake schedulers and the users are authenticated without a token. Needs benchmarks/requirements.txt
+# python -m benchmarks.load_test --theses 5000 --histories 20 --requests 500 --concurrency 20
+# python -m benchmarks.load_test --routes worker_data worker_data_binary --mongo-dsn mongodb://localhost:27017
+
+seed_batch_size = 1000
+categories = [
+    "Trí tuệ nhân tạo", "Phát triển web", "Ứng dụng di động", "Hệ thống nhúng",
+    "An toàn thông tin", "Khoa học dữ liệu", "Mạng máy tính", "Xử lý ngôn ngữ tự nhiên",
+]
+
+
+class FakeScheduler:
+    # Stands in for a celery task scheduling function, the calls are only counted
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs) -> str:
+        self.calls += 1
+        return f"{self.name}-{self.calls}"
+
+
+def install_fakes(args):
+    async def initialize():
+        if args.mongo_dsn:
+            client = motor_asyncio.AsyncIOMotorClient(args.mongo_dsn)
+        else:
+            from mongomock_motor import AsyncMongoMockClient
+            client = AsyncMongoMockClient()
+        await init_beanie(client[args.database], document_models=[ThesisData, ClusterHistory])
+
+    database.initialize = initialize
+    schedulers = {
+        "schedule_clustering": FakeScheduler("schedule_clustering"),
+        "schedule_preprocess": FakeScheduler("schedule_preprocess"),
+    }
+    cluster_history_service.schedule_clustering = schedulers["schedule_clustering"]
+    thesis_data_service.schedule_preprocess = schedulers["schedule_preprocess"]
+    app.dependency_overrides[get_current_user] = lambda: "load-test"
+    return schedulers
+
+
+async def seed_theses(args, rng: np.random.Generator) -> list:
+    now = datetime.utcnow()
+    collection = ThesisData.get_motor_collection()
+    documents = []
+    for index in range(args.theses):
+        document = {
+            "_id": ObjectId(),
+            "semester": f"{20221 + index % args.semesters}",
+            "title": f"Xây dựng hệ thống số {index} cho bài toán {categories[index % len(categories)].lower()}",
+            "category": categories[index % len(categories)],
+            "expected_result": f"Kết quả mong đợi của đề tài {index}",
+            "problem_solve": f"Giải quyết vấn đề của đề tài {index}",
+            "student_data": {"student_name": f"Sinh viên {index}", "student_id": f"{index:08d}"},
+            "created_at": now,
+            "updated_at": now,
+            "need_nlp_extract": False,
+            "nlp_job_id": None,
+        }
+        for field in vector_fields:
+            document[field] = encode_packed_vector(rng.standard_normal(args.dimension, dtype=np.float32))
+        documents.append(document)
+    for start in range(0, len(documents), seed_batch_size):
+        await collection.insert_many(documents[start:start + seed_batch_size])
+    return documents
+
+
+async def seed_histories(args, theses: list, rng: np.random.Generator) -> list:
+    # Finished histories over a whole semester, with one partial result per loop
+    now = datetime.utcnow()
+    collection = ClusterHistory.get_motor_collection()
+    config = json.loads(ClusterConfig(number_of_clusters=args.history_clusters, max_loop=args.history_loops).json())
+    history_ids = []
+    for index in range(args.histories):
+        semester = f"{20221 + index % args.semesters}"
+        members = [thesis for thesis in theses if thesis["semester"] == semester]
+        clusters = []
+        for loop in range(args.history_loops):
+            labels = rng.integers(args.history_clusters, size=len(members))
+            clusters.append({
+                "result_cluster": [
+                    {
+                        "name": f"Cluster {id_cluster + 1}",
+                        "description": None,
+                        "children": np.flatnonzero(labels == id_cluster).tolist(),
+                    }
+                    for id_cluster in range(args.history_clusters)
+                ],
+                "loop": loop + 1,
+            })
+        document = {
+            "_id": ObjectId(),
+            "name": f"Load test history {index}",
+            "description": None,
+            "clusters": clusters,
+            "chosen_loop": None,
+            "loss_values": np.sort(rng.random(args.history_loops))[::-1].tolist(),
+            "non_clustered_thesis": [
+                {
+                    "thesis_id": str(thesis["_id"]),
+                    "student_name": thesis["student_data"]["student_name"],
+                    "student_id": thesis["student_data"]["student_id"],
+                    "thesis_title": thesis["title"],
+                }
+                for thesis in members
+            ],
+            "created_at": now,
+            "updated_at": now,
+            "cluster_job_status": {"total_done_nlp": len(members), "total_thesis": len(members), "status": "FINISHED"},
+            "config": config,
+            "sweep_id": None,
+            "final_loss": None,
+        }
+        await collection.insert_one(document)
+        history_ids.append(str(document["_id"]))
+    return history_ids
+
+
+def get_scenarios(args, thesis_ids: list, history_ids: list) -> dict:
+    # Request of every route for the index of the request
+    pages = max(args.theses // 25, 1)
+    start_config = json.loads(ClusterConfig(number_of_clusters=args.history_clusters).json())
+
+    def history_id(index):
+        return history_ids[index % len(history_ids)]
+
+    return {
+        "thesis_data_list": lambda index: (
+            "GET", "/api/v1/thesis_data/list", {"params": {"page": index % pages + 1, "limit": 25}}),
+        "thesis_data_detail": lambda index: (
+            "GET", f"/api/v1/thesis_data/{thesis_ids[index % len(thesis_ids)]}", {}),
+        "cluster_history_list": lambda index: (
+            "GET", "/api/v1/cluster_history/list", {"params": {"page": 1, "limit": 10}}),
+        "cluster_history_detail": lambda index: (
+            "GET", f"/api/v1/cluster_history/{history_id(index)}", {}),
+        "clustering_start": lambda index: (
+            "POST", "/api/v1/clustering/start",
+            {"json": {"config": start_config, "filter": {"semester": f"{20221 + index % args.semesters}"}}}),
+        "cluster_history_result": lambda index: (
+            "GET", f"/api/v1/cluster_history/{history_id(index)}/result", {}),
+        "cluster_history_results": lambda index: (
+            "GET", f"/api/v1/cluster_history/{history_id(index)}/results", {"params": {"page": 1, "limit": 10}}),
+        "cluster_history_results_stream": lambda index: (
+            "GET", f"/api/v1/cluster_history/{history_id(index)}/results/stream", {}),
+        "history_status": lambda index: (
+            "GET", f"/internal_api/v1/cluster_history/{history_id(index)}/status", {}),
+        "nlp_pending": lambda index: (
+            "GET", f"/internal_api/v1/cluster_history/{history_id(index)}/nlp_pending", {}),
+        "worker_data": lambda index: (
+            "GET", f"/internal_api/v1/cluster_history/{history_id(index)}/worker_data", {}),
+        "worker_data_binary": lambda index: (
+            "GET", f"/internal_api/v1/cluster_history/{history_id(index)}/worker_data",
+            {"headers": {"Accept": vector_content_type}}),
+        "cluster_result": lambda index: (
+            "PUT", f"/internal_api/v1/cluster_history/{history_id(index)}/cluster_result",
+            {"json": {
+                "cluster_result": [{"name": "Cluster 1", "children": list(range(10))}],
+                "loss_values": [1.0],
+                "loop": index + 1,
+            }}),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, n_requests: int, concurrency: int) -> dict:
+    latencies = np.zeros(n_requests, dtype=np.float64)
+    statuses = Counter()
+    indices = itertools.count()
+
+    async def worker():
+        for index in indices:
+            if index >= n_requests:
+                return
+            method, url, options = make_request(index)
+            start = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies[index] = time.perf_counter() - start
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "throughput": n_requests / elapsed,
+        "mean_ms": float(latencies.mean() * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(latencies.max() * 1000),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def run(args) -> dict:
+    schedulers = install_fakes(args)
+    await app.router.startup()
+    # The rate limit of the api would answer most of the requests of a single client with 429
+    app.state.limiter.enabled = args.keep_limiter
+    try:
+        rng = np.random.default_rng(args.seed)
+        start = time.perf_counter()
+        theses = await seed_theses(args, rng)
+        history_ids = await seed_histories(args, theses, rng)
+        print(f"Seeded {len(theses)} theses and {len(history_ids)} histories in {time.perf_counter() - start:.1f}s")
+
+        scenarios = get_scenarios(args, [str(thesis["_id"]) for thesis in theses], history_ids)
+        unknown_routes = set(args.routes or []) - set(scenarios.keys())
+        if unknown_routes:
+            raise SystemExit(f"Unknown routes {sorted(unknown_routes)}, choose from {list(scenarios.keys())}")
+        results = {}
+        print(f"{'route':<24}{'req/s':>9}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses")
+        async with httpx.AsyncClient(app=app, base_url="http://load-test", timeout=None) as client:
+            for name in args.routes or scenarios.keys():
+                await run_scenario(client, scenarios[name], args.warmup, min(args.warmup, args.concurrency) or 1)
+                result = await run_scenario(client, scenarios[name], args.requests, args.concurrency)
+                results[name] = result
+                print(
+                    f"{name:<24}{result['throughput']:>9.1f}{result['mean_ms']:>9.1f}{result['p50_ms']:>9.1f}"
+                    f"{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}{result['max_ms']:>9.1f}  {result['statuses']}"
+                )
+        print(f"Fake scheduler calls: { {name: scheduler.calls for name, scheduler in schedulers.items()} }")
+        return results
+    finally:
+        if args.mongo_dsn:
+            await ThesisData.get_motor_collection().database.client.drop_database(args.database)
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theses", type=int, default=2000)
+    parser.add_argument("--semesters", type=int, default=4)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--histories", type=int, default=10)
+    parser.add_argument("--history-clusters", type=int, default=20)
+    parser.add_argument("--history-loops", type=int, default=30)
+    parser.add_argument("--routes", nargs="+", default=None, help="all the routes when unset")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5, help="requests per route before the measure")
+    parser.add_argument("--keep-limiter", action="store_true", help="keep the rate limit of the api")
+    parser.add_argument("--mongo-dsn", default=None, help="real mongo server instead of mongomock, the database is dropped at the end")
+    parser.add_argument("--database", default="load_test")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="json file for the results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from typing import Tuple
+
+import numpy as np
+
+from app.helpers.cluster.distance_helper import PairwiseDistanceCache
+from app.worker.thesis_cluster_class import ThesisClusterService, ThesisDataset
+
+# Synthetic thesis embeddings for the benchmarks: n_points spread over n_groups gaussian groups,
+# with the 4 fields of a thesis drawn around the same group center
+
+field_weights = [8, 4, 2, 1]
+generate_chunk_size = 4096
+
+
+def make_dataset(
+    n_points: int,
+    n_groups: int,
+    dimension: int = 768,
+    spread: float = 3.0,
+    seed: int = 0,
+    grouped_order: bool = False,
+) -> ThesisDataset:
+    # grouped_order keeps the points of a group next to each other, like theses uploaded batch by batch
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_groups, 4, dimension)) * spread
+    groups = rng.integers(n_groups, size=n_points)
+    if grouped_order:
+        groups = np.sort(groups)
+    # Drawn in row chunks, with the same values as a single draw, so large datasets do not need
+    # a float64 temporary of the whole N x 4 x D block
+    matrices = [np.empty((n_points, dimension), dtype=np.float32) for _ in range(4)]
+    for start in range(0, n_points, generate_chunk_size):
+        stop = min(start + generate_chunk_size, n_points)
+        points = centers[groups[start:stop]] + rng.normal(size=(stop - start, 4, dimension))
+        for field, matrix in enumerate(matrices):
+            matrix[start:stop] = points[:, field, :]
+    return ThesisDataset(matrices)
+
+
+def make_service(distance_cache: PairwiseDistanceCache) -> ThesisClusterService:
+    balance = [1 / value if value > 0 else 1 for value in distance_cache.get_max_field_distances()]
+    return ThesisClusterService(field_weights=field_weights, field_balance_multipliers=balance)
+
+
+def make_problem(
+    n_points: int,
+    n_groups: int,
+    dimension: int = 768,
+    spread: float = 3.0,
+    seed: int = 0,
+    grouped_order: bool = False,
+) -> Tuple[ThesisDataset, ThesisClusterService, PairwiseDistanceCache]:
+    dataset = make_dataset(n_points, n_groups, dimension, spread, seed, grouped_order)
+    distance_cache = PairwiseDistanceCache(dataset.matrices)
+    return dataset, make_service(distance_cache), distance_cache
@@ -5,6 +5,7 @@ from app.routers import routers
 from app.middlewares.limiters import add_limiters
 from app.middlewares.exception_handlers import add_exception_handlers
 from app.middlewares.cors import apply_cors
+from app.middlewares.metrics import add_metrics
 from app.settings import AppSettings
 
 app = FastAPI(title="Clustering")
@@ -18,6 +19,7 @@ async def app_init():
     add_limiters(app)
     apply_cors(app, app_settings.allowed_origins)
     add_exception_handlers(app)
+    add_metrics(app)
 
     # INIT DATABASE
     await database.initialize()
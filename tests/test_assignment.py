@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.helpers.cluster.assignment import assign_auction, assign_global_greedy, assign_sequential, \
+    get_assignment, get_cluster_members
+
+
+def random_membership(n_points, n_clusters, seed=0):
+    membership = np.random.default_rng(seed).random((n_points, n_clusters))
+    return membership / membership.sum(axis=1, keepdims=True)
+
+
+def best_total(membership, max_size_cluster):
+    # Exhaustive optimum of the total membership, for small problems only
+    n_points, n_clusters = membership.shape
+    best = -np.inf
+    for labels in itertools.product(range(n_clusters), repeat=n_points):
+        if max(np.bincount(labels, minlength=n_clusters)) <= max_size_cluster:
+            best = max(best, membership[np.arange(n_points), labels].sum())
+    return best
+
+
+@pytest.mark.parametrize("method", ["sequential", "global_greedy", "auction"])
+@pytest.mark.parametrize("n_points, n_clusters, max_size_cluster", [(30, 4, 8), (30, 4, 5), (12, 3, 4)])
+def test_capacity_is_respected(method, n_points, n_clusters, max_size_cluster):
+    labels = get_assignment(method, random_membership(n_points, n_clusters), max_size_cluster)
+
+    assigned = labels[labels >= 0]
+    assert np.bincount(assigned, minlength=n_clusters).max() <= max_size_cluster
+    # Points are only left out once every cluster is full
+    assert len(assigned) == min(n_points, n_clusters * max_size_cluster)
+
+
+def test_sequential_gives_each_point_its_best_cluster_with_room():
+    membership = np.array([
+        [0.9, 0.1],
+        [0.8, 0.2],
+        [0.7, 0.3],
+    ])
+    assert assign_sequential(membership, 2).tolist() == [0, 0, 1]
+
+
+def test_global_greedy_takes_the_strongest_pairs_first():
+    membership = np.array([
+        [0.6, 0.4],
+        [0.9, 0.1],
+        [0.8, 0.2],
+    ])
+    # Point 0 has the weakest claim on cluster 0, sequential would have given it cluster 0
+    assert assign_global_greedy(membership, 2).tolist() == [1, 0, 0]
+    assert assign_sequential(membership, 2).tolist() == [0, 0, 1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_auction_is_near_optimal(seed):
+    membership = random_membership(7, 3, seed)
+    labels = assign_auction(membership, 3, epsilon=1e-6)
+
+    total = membership[np.arange(len(labels)), labels].sum()
+    assert total >= best_total(membership, 3) - len(labels) * 1e-6
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        get_assignment("random", random_membership(4, 2), 2)
+
+
+def test_cluster_members_keep_index_order():
+    labels = np.array([1, 0, 1, -1, 0])
+    assert get_cluster_members(labels, 2) == [[1, 4], [0, 2]]
@@ -0,0 +1,77 @@
+import pytest
+
+from app.helpers.cluster_results import get_result_pipeline
+
+# The pipeline is run by a small evaluator of the operators it uses, with the semantics of mongodb
+
+
+def evaluate(expression, document):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, args), = expression.items()
+    if operator == "$literal":
+        return args
+    values = [evaluate(arg, document) for arg in args] if isinstance(args, list) else evaluate(args, document)
+    if operator == "$size":
+        return len(values)
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$and":
+        return all(values)
+    if operator == "$gte":
+        return values[0] >= values[1]
+    if operator == "$lt":
+        return values[0] < values[1]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$subtract":
+        return values[0] - values[1]
+    if operator == "$arrayElemAt":
+        array, position = values
+        # Negative positions count from the end, out of range positions give a missing field
+        return array[position] if -len(array) <= position < len(array) else None
+    raise NotImplementedError(operator)
+
+
+def run_pipeline(document, index=None):
+    for stage in get_result_pipeline(["chosen_loop"], index):
+        (name, fields), = stage.items()
+        values = {key: evaluate(value, document) for key, value in fields.items() if value != 1}
+        if name == "$project":
+            document = {key: document.get(key) for key, value in fields.items() if value == 1}
+        document = dict(document, **{key: value for key, value in values.items() if value is not None})
+    return document
+
+
+def make_history(n_results, chosen_loop=None):
+    return {"clusters": [{"loop": loop + 1} for loop in range(n_results)], "chosen_loop": chosen_loop}
+
+
+@pytest.mark.parametrize("index, expected", [(0, 0), (3, 3), (4, 4), (-1, 4), (-5, 0)])
+def test_result_at_index(index, expected):
+    history = run_pipeline(make_history(5), index)
+    assert history["result"] == {"loop": expected + 1}
+    assert history["result_index"] == expected
+    assert history["total_results"] == 5
+
+
+@pytest.mark.parametrize("index", [5, 9, -6, -7])
+def test_index_out_of_range_has_no_result(index):
+    assert "result" not in run_pipeline(make_history(5), index)
+
+
+@pytest.mark.parametrize("chosen_loop, expected", [(None, 4), (2, 2), (5, 4), (-1, 4)])
+def test_default_result(chosen_loop, expected):
+    history = run_pipeline(make_history(5, chosen_loop))
+    assert history["result"] == {"loop": expected + 1}
+    assert history["result_index"] == expected
+
+
+def test_history_without_results():
+    history = run_pipeline(make_history(0))
+    assert "result" not in history
+    assert history["total_results"] == 0
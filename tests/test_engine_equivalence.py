@@ -0,0 +1,50 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.helpers.cluster.clustering_helper import ClusteringAlgorithm
+from app.helpers.cluster.vectorized_clustering_helper import VectorizedClusteringAlgorithm
+from benchmarks.synthetic import make_problem
+
+# The engines are selectable so their results can be compared, the fast ones must follow the reference
+
+
+@pytest.fixture(scope="module")
+def problem():
+    return make_problem(80, 4, dimension=16, seed=1)
+
+
+def run_engine(engine_class, problem, init_method, **options):
+    dataset, service, distance_cache = problem
+    if issubclass(engine_class, VectorizedClusteringAlgorithm):
+        options["distance_cache"] = distance_cache
+    random.seed(0)
+    algorithm = engine_class(
+        dataset=dataset,
+        model=service,
+        n_clusters=4,
+        max_size_cluster=22,
+        upper_m=1.1,
+        lower_m=9.1,
+        n_loop=5,
+        init_method=init_method,
+        random_state=0,
+        **options
+    )
+    results = list(algorithm.clustering())
+    labels, loss_values = results[-1]
+    return [sorted(int(index) for index in cluster) for cluster in labels], loss_values
+
+
+@pytest.mark.parametrize("init_method", ["legacy", "kmeans++"])
+@pytest.mark.parametrize("engine_class, options", [
+    (VectorizedClusteringAlgorithm, {}),
+])
+def test_engine_matches_reference(problem, init_method, engine_class, options):
+    reference_labels, reference_loss = run_engine(ClusteringAlgorithm, problem, init_method)
+    labels, loss_values = run_engine(engine_class, problem, init_method, **options)
+
+    assert labels == reference_labels
+    assert len(loss_values) == len(reference_loss)
+    np.testing.assert_allclose(loss_values, reference_loss, rtol=1e-5)
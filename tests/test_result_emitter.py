@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from app.worker.result_emitter import ResultEmitter
+
+
+def make_emitter(sent, **options):
+    return ResultEmitter(send=sent.append, n_points=4, **options)
+
+
+def test_every_loop_is_sent_in_order():
+    sent = []
+    emitter = make_emitter(sent)
+    emitter.add([[0, 1], [2, 3]], [3.0])
+    emitter.add([[0, 2], [1, 3]], [3.0, 2.0])
+    emitter.finish()
+    emitter.close()
+
+    assert [payload["result_index"] for payload in sent] == [0, 1]
+    assert [payload["loop"] for payload in sent] == [1, 2]
+    # Only the loss values computed since the previous result are sent
+    assert [payload["loss_values"] for payload in sent] == [[3.0], [2.0]]
+    assert sent[1]["cluster_result"] == [
+        {"name": "Cluster 1", "children": [0, 2]},
+        {"name": "Cluster 2", "children": [1, 3]},
+    ]
+
+
+def test_throttled_results_keep_the_last_one():
+    sent = []
+    emitter = make_emitter(sent, emit_every=3)
+    for loop in range(5):
+        emitter.add([[0, 1], [2, 3]], [float(value) for value in range(loop + 1)])
+    emitter.finish()
+    emitter.close()
+
+    assert [payload["loop"] for payload in sent] == [1, 4, 5]
+    assert [payload["result_index"] for payload in sent] == [0, 1, 2]
+    assert sum(len(payload["loss_values"]) for payload in sent) == 5
+
+
+def test_label_change_triggers_a_result():
+    sent = []
+    emitter = make_emitter(sent, emit_every=100, emit_label_change=0.5)
+    emitter.add([[0, 1], [2, 3]], [1.0])
+    emitter.add([[0, 1, 2], [3]], [1.0])
+    emitter.add([[1, 2], [0, 3]], [1.0])
+    emitter.close()
+
+    assert [payload["loop"] for payload in sent] == [1, 3]
+
+
+def test_failure_of_a_request_in_flight_is_raised():
+    release = threading.Event()
+    calls = []
+
+    def send(payload):
+        calls.append(payload["result_index"])
+        if payload["result_index"] == 0:
+            release.wait(5)
+            raise RuntimeError("refused")
+
+    emitter = ResultEmitter(send=send, n_points=4)
+    emitter.add([[0, 1], [2, 3]], [1.0])
+    # The first request is still in flight when the next results are queued
+    emitter.add([[0, 1], [2, 3]], [1.0])
+    release.set()
+    with pytest.raises(RuntimeError):
+        emitter.finish()
+    emitter.close()
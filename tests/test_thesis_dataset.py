@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from app.worker.thesis_cluster_class import ThesisClusterObject, ThesisClusterService, ThesisDataset, \
+    get_thesis_matrices, thesis_fields
+
+
+def make_items(n_points=12, dimension=6, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{field: rng.standard_normal(dimension).tolist() for field in thesis_fields} for _ in range(n_points)]
+
+
+def reference_centroid(uik_pow, items):
+    # Per object computation of the centroid before the contiguous matrices
+    total_uik = sum(uik_pow)
+    centroid = {}
+    for field in thesis_fields:
+        result = np.zeros_like(items[0][field])
+        for uik, item in zip(uik_pow, items):
+            result += np.array([value * uik for value in item[field]])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result /= total_uik
+        centroid[field] = result
+    return centroid
+
+
+@pytest.fixture
+def service():
+    return ThesisClusterService(field_weights=[8, 4, 2, 1], field_balance_multipliers=[1, 1, 1, 1])
+
+
+def test_dataset_rows_match_the_items():
+    items = make_items()
+    dataset = ThesisDataset.from_vectors(items)
+
+    assert len(dataset) == len(items)
+    for item, thesis in zip(items, dataset):
+        for field in thesis_fields:
+            assert getattr(thesis, field).dtype == np.float32
+            np.testing.assert_allclose(getattr(thesis, field), item[field], rtol=1e-6)
+
+
+def test_matrices_of_a_list_match_the_dataset():
+    dataset = ThesisDataset.from_vectors(make_items())
+    objects = [ThesisClusterObject(*[getattr(thesis, field) for field in thesis_fields]) for thesis in dataset]
+
+    for from_list, from_dataset in zip(get_thesis_matrices(objects), get_thesis_matrices(dataset)):
+        np.testing.assert_array_equal(from_list, from_dataset)
+
+
+@pytest.mark.parametrize("as_list", [False, True])
+def test_centroid_matches_the_per_object_result(service, as_list):
+    items = make_items()
+    dataset = ThesisDataset.from_vectors(items)
+    data = list(dataset) if as_list else dataset
+    uik_pow = np.random.default_rng(1).random(len(items)).tolist()
+
+    centroid = service.calculate_centroid_from_list_and_uik(uik_pow, data)
+    expected = reference_centroid(uik_pow, items)
+    for field in thesis_fields:
+        np.testing.assert_allclose(getattr(centroid, field), expected[field], rtol=1e-5, atol=1e-6)
+
+
+def test_centroid_with_every_weight_zero(service):
+    # The per object result divides by a zero total, the matrices give the same undefined centroid
+    items = make_items()
+    uik_pow = [0.0] * len(items)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroid = service.calculate_centroid_from_list_and_uik(uik_pow, ThesisDataset.from_vectors(items))
+    expected = reference_centroid(uik_pow, items)
+    for field in thesis_fields:
+        assert np.isnan(expected[field]).all()
+        np.testing.assert_array_equal(np.isnan(getattr(centroid, field)), np.isnan(expected[field]))
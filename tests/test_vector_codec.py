@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.helpers.vector_codec import decode_vector_frame, encode_vector_frame, is_vector_content, pack_vector, \
+    unpack_vector, vector_content_type
+
+
+def test_vector_frame_round_trip():
+    vectors = np.random.default_rng(0).standard_normal((5, 4, 8)).astype(np.float32)
+    header = {"message": "Đề tài", "data": {"ready_for_cluster": True}}
+
+    decoded_header, decoded = decode_vector_frame(encode_vector_frame(header, vectors))
+
+    assert decoded_header == header
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, vectors)
+
+
+def test_empty_vector_frame():
+    _, decoded = decode_vector_frame(encode_vector_frame({}, np.zeros((0, 4, 0), dtype=np.float32)))
+    assert decoded.shape == (0, 4, 0)
+
+
+@pytest.mark.parametrize("content", [b"", b"XXXX\x01\x00\x00\x00\x00"])
+def test_invalid_vector_frame(content):
+    with pytest.raises(ValueError):
+        decode_vector_frame(content)
+
+
+def test_truncated_vector_frame():
+    content = encode_vector_frame({}, np.ones((2, 3), dtype=np.float32))
+    with pytest.raises(ValueError):
+        decode_vector_frame(content[:-4])
+
+
+def test_packed_vector_round_trip():
+    vector = np.random.default_rng(1).standard_normal(768).astype(np.float32)
+
+    np.testing.assert_array_equal(unpack_vector(pack_vector(vector)), vector)
+    half = unpack_vector(pack_vector(vector, "float16"))
+    assert half.dtype == np.float32
+    np.testing.assert_allclose(half, vector, rtol=1e-3, atol=1e-3)
+
+
+def test_vector_content_type():
+    assert is_vector_content(f"{vector_content_type}; charset=binary")
+    assert not is_vector_content("application/json")
+    assert not is_vector_content(None)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app.helpers.vector_codec import encode_vector_frame, vector_content_type
+from app.helpers.vector_request import get_vector_body_openapi, parse_vector_body
+
+
+class VectorRequest(BaseModel):
+    title_vector: list
+    category_vector: list
+
+
+vector_fields = ["title_vector", "category_vector"]
+
+
+async def parse_request(request: Request) -> VectorRequest:
+    return parse_vector_body(await request.body(), request.headers.get("content-type"), VectorRequest, vector_fields)
+
+
+app = FastAPI()
+
+
+@app.put("/vectors", openapi_extra=get_vector_body_openapi(VectorRequest))
+async def put_vectors(data: VectorRequest = Depends(parse_request)):
+    return data
+
+
+client = TestClient(app)
+
+
+def test_json_body():
+    res = client.put("/vectors", json={"title_vector": [1.0, 2.0], "category_vector": [3.0]})
+    assert res.status_code == 200
+    assert res.json() == {"title_vector": [1.0, 2.0], "category_vector": [3.0]}
+
+
+def test_vector_frame_body():
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    res = client.put(
+        "/vectors", content=encode_vector_frame({}, vectors), headers={"content-type": vector_content_type}
+    )
+    assert res.status_code == 200
+    assert res.json() == {"title_vector": [0.0, 1.0, 2.0], "category_vector": [3.0, 4.0, 5.0]}
+
+
+@pytest.mark.parametrize("content", [b"{not json", b'{"title_vector": [1.0]}', b"[]"])
+def test_bad_json_body(content):
+    res = client.put("/vectors", content=content, headers={"content-type": "application/json"})
+    assert res.status_code == 422
+
+
+@pytest.mark.parametrize("content", [
+    b"TVEC",
+    encode_vector_frame({}, np.zeros((3, 2), dtype=np.float32))[:-4],
+    encode_vector_frame({}, np.zeros((3, 2), dtype=np.float32)),
+])
+def test_bad_vector_frame_body(content):
+    res = client.put("/vectors", content=content, headers={"content-type": vector_content_type})
+    assert res.status_code == 422
+
+
+def test_both_content_types_documented():
+    content = client.get("/openapi.json").json()["paths"]["/vectors"]["put"]["requestBody"]["content"]
+    assert set(content) == {"application/json", vector_content_type}
+    assert set(content["application/json"]["schema"]["properties"]) == set(vector_fields)